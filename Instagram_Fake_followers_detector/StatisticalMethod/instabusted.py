@@ -1,9 +1,28 @@
 from instagram_private_api import Client, ClientCompatPatch
-from matplotlib import pyplot as plt
+import matplotlib
+import numpy as np
 
+import argparse
 import getpass
 import random
 
+# Above this many points the scatter plot is replaced by a hexbin density plot
+HEXBIN_THRESHOLD = 5000
+
+
+# COMMAND LINE OPTIONS
+parser = argparse.ArgumentParser(description="Audit an Instagram account's followers")
+parser.add_argument('--output', help='write the graph to this PNG or SVG file instead of showing it')
+parser.add_argument('--hexbin-threshold', type=int, default=HEXBIN_THRESHOLD,
+                    help='number of points above which a density plot is drawn')
+args = parser.parse_args()
+
+# Headless report mode: render without a display
+if args.output:
+    matplotlib.use('Agg')
+
+from matplotlib import pyplot as plt
+
 
 # INITIAL AUTHENTICATION
 def login():
@@ -96,19 +115,37 @@ print(username + " has " + str(100-percentage_fake) + "% authenticity!")
 
 
 # GENERATE THE GRAPH
+def plot_following_followers(x, y, username, output=None, hexbin_threshold=HEXBIN_THRESHOLD):
+    # Log axes need positive values, so smooth zeros to 1 as in the ratio above
+    x = np.maximum(np.asarray(x, dtype=float), 1)
+    y = np.maximum(np.asarray(y, dtype=float), 1)
+
+    f, ax = plt.subplots(figsize=(16,10))
+    if len(x) > hexbin_threshold:
+        hb = ax.hexbin(x, y, xscale='log', yscale='log', bins='log', gridsize=100, mincnt=1)
+        f.colorbar(hb, ax=ax, label='Accounts')
+    else:
+        ax.scatter(x, y)
+        ax.set_xscale('log')
+        ax.set_yscale('log')
+
+    # The 1:1 line only needs its two endpoints
+    upper = max(x.max(), y.max())
+    ax.plot([1, upper], [1, upper], color='red', linewidth=2, label='following:followers = 1:1')
+    ax.legend(fontsize=14)
+    ax.set_title('Following:Followers plot for user:' + username + ' Instagram Followers', size=20)
+    ax.set_xlabel('Followers', size=14)
+    ax.set_ylabel('Following', size=14)
+
+    if output:
+        f.savefig(output)
+        plt.close(f)
+        print("Graph saved to " + output)
+    else:
+        plt.show()
+
+
 x = [x[0] for x in tuples]
 y = [x[1] for x in tuples]
 
-f, ax = plt.subplots(figsize=(16,10))
-plt.scatter(x,y)
-plt.plot([i for i in range(max(max(x), max(y)))], 
-         [i for i in range(max(max(x), max(y)))], 
-         color = 'red', 
-         linewidth = 2, label='following:followers = 1:1'
-         )
-plt.text(2500, 4000, 'following:followers = 1:1', size=14)
-plt.title('Following:Followers plot for user:' + username + ' Instagram Followers', size=20)
-plt.xlabel('Followers', size=14)
-plt.ylabel('Following', size=14)
-
-plt.show()
+plot_following_followers(x, y, username, args.output, args.hexbin_threshold)
@@ -1,6 +1,7 @@
 from instagram_private_api import Client, ClientCompatPatch
 import random
 import sys
+import numpy as np
 import os
 
 # Import the ML model
@@ -45,14 +46,13 @@ def calculate_engagement_rate(posts, follower_count):
     if not posts or follower_count == 0:
         return 0.0
     
-    total_likes = sum(post.get('like_count', 0) for post in posts)
-    total_comments = sum(post.get('comment_count', 0) for post in posts)
-    total_engagement = total_likes + total_comments
+    likes = np.fromiter((post.get('like_count', 0) for post in posts), dtype=np.float64, count=len(posts))
+    comments = np.fromiter((post.get('comment_count', 0) for post in posts), dtype=np.float64, count=len(posts))
     
-    avg_engagement_per_post = total_engagement / len(posts)
+    avg_engagement_per_post = (likes + comments).mean()
     engagement_rate = (avg_engagement_per_post / follower_count) * 100
     
-    return engagement_rate
+    return float(engagement_rate)
 
 def run_audit(username: str, password: str, target_username: str = None):
     result = {}
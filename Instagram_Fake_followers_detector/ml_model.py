@@ -2,23 +2,25 @@ import pandas as pd
 import numpy as np
 import pickle
 import os
+import sys
 from sklearn.ensemble import RandomForestClassifier
 
 # Path to the model file
 MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
 MODEL_PATH = os.path.join(MODEL_DIR, 'rfc_model.pkl')
 
+# The labelled-dataset loader is shared with the Flask backend
+sys.path.append(os.path.join(os.path.dirname(MODEL_DIR), 'flask_backend', 'model'))
+
 def train_model():
     """
     Train the Random Forest Classifier model using the training data.
     This would normally be run once and the model saved.
     """
-    # Load training data
-    train = pd.read_csv(os.path.join(MODEL_DIR, "train.csv"))
-    
-    # Split into features and labels
-    train_Y = train.fake
-    train_X = train.drop(columns='fake')
+    from dataset import load_training_data
+
+    # Load training data (memory-mapped from its binary cache)
+    train_X, train_Y = load_training_data(os.path.join(MODEL_DIR, "train.csv"))
     
     # Train the model
     rfc = RandomForestClassifier()
@@ -1,14 +1,175 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, request, jsonify, render_template, send_file
+import gzip
+import json
 import sys
+import threading
 import traceback
 import os
 
-# Import the model from the specific notebook implementation
+# The model from the specific notebook implementation lives in model/.
+# It pulls in pandas, scikit-learn and Playwright, so it is only imported
+# on first use (or by warm_up() in a pre-fork master).
 sys.path.append(os.path.join(os.path.dirname(__file__), 'model'))
-from instagram_audit import run_audit
+import audit_history
+import profiling
+import scheduler
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip is always available
+    brotli = None
 
 app = Flask(__name__)
 
+# Responses smaller than this are not worth compressing
+MIN_COMPRESS_BYTES = 500
+
+_warm_up_lock = threading.Lock()
+_warm_up_thread = None
+_warm_up_error = None
+_scheduler_lock = threading.Lock()
+_scheduler = None
+_tenant_keys = None
+
+
+def get_audit_module():
+    """Import the audit module on first use"""
+    import instagram_audit
+    return instagram_audit
+
+
+def is_warm():
+    """True once the audit module is imported and its model is built"""
+    instagram_audit = sys.modules.get('instagram_audit')
+    return instagram_audit is not None and instagram_audit.rfc_model is not None
+
+
+def warm_up(start_scorer=True):
+    """
+    Import the audit module and build the model.
+
+    Called in the pre-fork master so forked workers share the loaded model
+    copy-on-write; the batch scorer thread is started per worker instead.
+    """
+    instagram_audit = get_audit_module()
+    instagram_audit.get_model()
+    if start_scorer:
+        start_batch_scoring()
+
+
+def start_batch_scoring():
+    """Score followers from concurrent audits in shared micro-batches"""
+    if os.environ.get('IGAUDIT_BATCH_SCORING') == '1':
+        get_audit_module().start_batch_scorer(
+            max_batch_size=int(os.environ.get('IGAUDIT_BATCH_SIZE', 256)),
+            max_wait_ms=float(os.environ.get('IGAUDIT_BATCH_WAIT_MS', 5)))
+
+
+def run_scheduled_audit(**kwargs):
+    """Audit function run by the scheduler's slots"""
+    return get_audit_module().run_audit(**kwargs)
+
+
+def get_scheduler():
+    """
+    The fair-share scheduler in front of run_audit, created on first use.
+
+    IGAUDIT_AUDIT_SLOTS sets the number of concurrent audits shared by all
+    workers and IGAUDIT_TENANT_QUOTAS takes a JSON object of tenant ->
+    {weight, max_concurrent, max_queued} overrides.
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            quotas = json.loads(os.environ.get('IGAUDIT_TENANT_QUOTAS', '{}'))
+            _scheduler = scheduler.FairShareScheduler(
+                run_scheduled_audit,
+                slots=int(os.environ.get('IGAUDIT_AUDIT_SLOTS', scheduler.AUDIT_SLOTS)),
+                tenant_quotas={
+                    tenant: scheduler.quota_for(tenant)._replace(**quota)
+                    for tenant, quota in quotas.items()
+                })
+    return _scheduler
+
+
+def get_tenant_keys():
+    """API key -> tenant mapping from IGAUDIT_TENANT_KEYS, read once"""
+    global _tenant_keys
+    if _tenant_keys is None:
+        _tenant_keys = json.loads(os.environ.get('IGAUDIT_TENANT_KEYS', '{}'))
+    return _tenant_keys
+
+
+def request_tenant():
+    """
+    The tenant of the current request, identified by its X-API-Key header.
+
+    Requests without a key share the default tenant.
+
+    Raises:
+        PermissionError: If the key is not configured
+    """
+    api_key = request.headers.get('X-API-Key')
+    if not api_key:
+        return scheduler.DEFAULT_TENANT
+    tenant = get_tenant_keys().get(api_key)
+    if tenant is None:
+        raise PermissionError('Invalid API key')
+    return tenant
+
+
+def audit_response(result):
+    """JSON body for a finished audit"""
+    # Return only the first page of per-follower lists; the rest is
+    # served from the stored result by /audits/<audit_id>/fake-followers
+    if result.get('status') == 'success':
+        conn = audit_history.connect()
+        try:
+            audit_history.paginate_result(conn, result)
+        finally:
+            conn.close()
+
+    body = {
+        'success': result.get('status') == 'success',
+        'data': result if result.get('status') == 'success' else None,
+        'error': result.get('error') if result.get('status') == 'error' else None,
+        'status': result.get('status'),
+        'audit_id': result.get('audit_id'),
+    }
+    # Failed and partial audits are the ones worth profiling, so the profile
+    # is returned whatever the outcome
+    if 'profile' in result:
+        body['profile'] = result['profile']
+    return body
+
+
+def _warm_up_thread_main():
+    global _warm_up_thread, _warm_up_error
+    try:
+        warm_up()
+    except Exception as e:
+        print(f"Warm-up failed: {e}")
+        traceback.print_exc()
+        with _warm_up_lock:
+            _warm_up_error = str(e)
+            # Let the next readiness probe retry
+            _warm_up_thread = None
+    else:
+        with _warm_up_lock:
+            _warm_up_error = None
+
+
+def warm_up_in_background():
+    """Start warm_up() in a background thread unless it is already running"""
+    global _warm_up_thread
+    with _warm_up_lock:
+        if _warm_up_thread is None:
+            _warm_up_thread = threading.Thread(
+                target=_warm_up_thread_main, name='warm-up', daemon=True)
+            _warm_up_thread.start()
+        return _warm_up_thread
+
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -20,20 +181,46 @@ def audit():
         username = data.get('username')
         password = data.get('password')
         target_username = data.get('target_username')
+        incremental = bool(data.get('incremental', False))
+        profile = bool(data.get('profile', False))
+        priority = data.get('priority', scheduler.INTERACTIVE)
         
         if not username or not password:
             return jsonify({
                 'success': False,
                 'error': 'Username and password are required'
             }), 400
-            
-        result = run_audit(username, password, target_username)
-        
-        return jsonify({
-            'success': result.get('status') == 'success',
-            'data': result if result.get('status') == 'success' else None,
-            'error': result.get('error') if result.get('status') == 'error' else None
-        })
+        if priority not in scheduler.PRIORITY_CLASSES:
+            return jsonify({
+                'success': False,
+                'error': f"priority must be one of {', '.join(scheduler.PRIORITY_CLASSES)}"
+            }), 400
+        try:
+            tenant = request_tenant()
+        except PermissionError as e:
+            return jsonify({'success': False, 'error': str(e)}), 401
+
+        try:
+            job = get_scheduler().submit(
+                tenant, priority, username=username, password=password,
+                target_username=target_username, incremental=incremental,
+                profile=profile)
+        except scheduler.AdmissionError as e:
+            response = jsonify({
+                'success': False,
+                'error': str(e),
+                'expected_wait_seconds': e.expected_wait
+            })
+            if e.expected_wait is not None:
+                response.headers['Retry-After'] = str(int(e.expected_wait))
+            return response, 429
+
+        # Batch audits run when capacity is idle; poll /jobs/<job_id> for the result
+        if priority == scheduler.BATCH:
+            return jsonify({'success': True, 'job': job.describe()}), 202
+
+        result = job.future.result()
+        return jsonify(audit_response(result))
     except Exception as e:
         return jsonify({
             'success': False,
@@ -41,13 +228,164 @@ def audit():
             'trace': traceback.format_exc()
         }), 500
 
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = get_scheduler().get_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    body = {'success': True, 'job': job.describe()}
+    if job.status == 'done':
+        body.update(audit_response(job.result))
+    return jsonify(body)
+
+@app.route('/metrics/scheduler', methods=['GET'])
+def scheduler_metrics():
+    return jsonify({'success': True, 'data': get_scheduler().stats()})
+
+@app.route('/profiles/<profile_id>', methods=['GET'])
+def download_profile(profile_id):
+    fmt = request.args.get('format', 'speedscope')
+    path = profiling.profile_path(profile_id, fmt)
+    if path is None:
+        return jsonify({'success': False, 'error': 'Invalid profile ID or format'}), 400
+    if not os.path.exists(path):
+        return jsonify({'success': False, 'error': 'Profile not found'}), 404
+    return send_file(path, as_attachment=True, download_name=os.path.basename(path))
+
+@app.route('/audits/<audit_id>', methods=['GET'])
+def get_audit(audit_id):
+    conn = audit_history.connect()
+    try:
+        result = audit_history.get_audit(conn, audit_id)
+        if result is not None:
+            audit_history.paginate_result(conn, result)
+    finally:
+        conn.close()
+    if result is None:
+        return jsonify({'success': False, 'error': 'Audit not found'}), 404
+    return cacheable(jsonify({'success': True, 'data': result}))
+
+@app.route('/audits/<audit_id>/fake-followers', methods=['GET'])
+def get_fake_followers(audit_id):
+    cursor = request.args.get('cursor')
+    limit = request.args.get('limit', default=audit_history.PAGE_SIZE, type=int)
+    conn = audit_history.connect()
+    try:
+        usernames, next_cursor = audit_history.fake_followers_page(
+            conn, audit_id, cursor, limit)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    finally:
+        conn.close()
+    return cacheable(jsonify({
+        'success': True,
+        'data': {'usernames': usernames, 'next_cursor': next_cursor},
+    }))
+
+@app.route('/audits/<audit_id>/churn/<kind>', methods=['GET'])
+def get_churn(audit_id, kind):
+    cursor = request.args.get('cursor')
+    limit = request.args.get('limit', default=audit_history.PAGE_SIZE, type=int)
+    conn = audit_history.connect()
+    try:
+        usernames, next_cursor = audit_history.churn_page(
+            conn, audit_id, kind, cursor, limit)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    finally:
+        conn.close()
+    return cacheable(jsonify({
+        'success': True,
+        'data': {'usernames': usernames, 'next_cursor': next_cursor},
+    }))
+
+@app.route('/history/<target>/authenticity', methods=['GET'])
+def authenticity_history(target):
+    since = request.args.get('since', type=float)
+    until = request.args.get('until', type=float)
+    limit = request.args.get('limit', type=int)
+    conn = audit_history.connect()
+    try:
+        series = audit_history.authenticity_series(conn, target, since, until, limit)
+    finally:
+        conn.close()
+    return jsonify({'success': True, 'data': series})
+
+@app.route('/history/<target>/top-fakes', methods=['GET'])
+def top_fake_followers(target):
+    limit = request.args.get('limit', default=20, type=int)
+    conn = audit_history.connect()
+    try:
+        fakes = audit_history.top_fake_followers(conn, target, limit)
+    finally:
+        conn.close()
+    return jsonify({'success': True, 'data': fakes})
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    if is_warm():
+        return jsonify({'ready': True})
+    # Readiness probes on a cold worker kick off the warm-up without blocking
+    # (and retry it after a failure, reporting the last error)
+    error = _warm_up_error
+    warm_up_in_background()
+    return jsonify({'ready': False, 'error': error}), 503
+
+@app.route('/metrics/scoring', methods=['GET'])
+def scoring_metrics():
+    instagram_audit = sys.modules.get('instagram_audit')
+    scorer = instagram_audit.batch_scorer if instagram_audit else None
+    if scorer is None:
+        return jsonify({'success': True, 'data': {'running': False}})
+    return jsonify({'success': True, 'data': scorer.metrics()})
+
+def cacheable(response):
+    """
+    Tag a response for a stored (immutable) result with an ETag and answer
+    If-None-Match with 304 Not Modified.
+    """
+    response.add_etag()
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+def compress(response):
+    """Compress the body with brotli or gzip as negotiated by Accept-Encoding"""
+    if (response.status_code != 200 or response.direct_passthrough
+            or 'Content-Encoding' in response.headers):
+        return response
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    if len(data) < MIN_COMPRESS_BYTES:
+        return response
+
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        encoding, data = 'br', brotli.compress(data)
+    elif accepted['gzip']:
+        encoding, data = 'gzip', gzip.compress(data, compresslevel=6)
+    else:
+        return response
+
+    response.set_data(data)
+    response.headers['Content-Encoding'] = encoding
+    # The ETag describes the uncompressed representation
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
 # Enable CORS for frontend
 @app.after_request
 def after_request(response):
     response.headers.add('Access-Control-Allow-Origin', '*')
-    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
+    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization,If-None-Match,X-API-Key')
     response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE')
-    return response
+    response.headers.add('Access-Control-Expose-Headers', 'ETag')
+    return compress(response)
 
 if __name__ == '__main__':
+    warm_up_in_background()
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,100 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(BACKEND_DIR)
+
+# One follower profile used to check that a worker can score
+SAMPLE_PROFILE = {
+    'username': 'sample_user123',
+    'full_name': 'Sample User',
+    'profile_pic_url': 'https://example.com/pic.jpg',
+    'biography': 'Just a sample account',
+    'external_url': None,
+    'is_private': False,
+    'media_count': 12,
+    'follower_count': 150,
+    'following_count': 200,
+}
+
+
+def time_import(statement, repeats):
+    """Time a fresh interpreter running the given import statement"""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', statement], cwd=BACKEND_DIR, check=True)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def spawn_workers(count, preloaded):
+    """
+    Fork workers and time until each has scored one profile.
+
+    With preloaded=True the model is built in this (master) process before
+    forking, as gunicorn's preload_app does; otherwise every worker builds
+    it after the fork.
+    """
+    import app
+
+    if preloaded:
+        app.warm_up(start_scorer=False)
+
+    timings = []
+    for _ in range(count):
+        read_fd, write_fd = os.pipe()
+        start = time.perf_counter()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            module = app.get_audit_module()
+            module.predict_fake_followers([SAMPLE_PROFILE])
+            os.write(write_fd, b'1')
+            os._exit(0)
+        os.close(write_fd)
+        os.read(read_fd, 1)
+        timings.append(time.perf_counter() - start)
+        os.close(read_fd)
+        os.waitpid(pid, 0)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark Flask backend import time and worker spawn time')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    results = {
+        'import_app_s': time_import('import app', args.repeats),
+        'import_app_and_warm_up_s': time_import('import app; app.warm_up()', args.repeats),
+    }
+
+    if hasattr(os, 'fork'):
+        # Each mode runs in its own interpreter so the first does not warm the second
+        for mode in ['cold', 'preloaded']:
+            output = subprocess.run(
+                [sys.executable, __file__, '--spawn', mode, '--workers', str(args.workers)],
+                cwd=BACKEND_DIR, check=True, capture_output=True, text=True).stdout
+            results[f'worker_ready_{mode}_s'] = json.loads(output.strip().splitlines()[-1])
+    else:
+        print("os.fork is not available, skipping the worker spawn benchmark")
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    if '--spawn' in sys.argv:
+        spawn_parser = argparse.ArgumentParser()
+        spawn_parser.add_argument('--spawn', choices=['cold', 'preloaded'])
+        spawn_parser.add_argument('--workers', type=int, default=4)
+        spawn_args = spawn_parser.parse_args()
+        print(json.dumps(spawn_workers(spawn_args.workers, spawn_args.spawn == 'preloaded')))
+    else:
+        main()
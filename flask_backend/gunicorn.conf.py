@@ -0,0 +1,31 @@
+# Pre-fork configuration for serving the Flask backend with gunicorn:
+#
+#     gunicorn -c gunicorn.conf.py app:app
+#
+# The app is imported and the model built once in the master. Forked
+# workers share those pages copy-on-write and are ready as soon as they
+# start accepting connections.
+import gc
+import multiprocessing
+import os
+
+bind = os.environ.get('IGAUDIT_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('IGAUDIT_WORKERS', multiprocessing.cpu_count()))
+threads = int(os.environ.get('IGAUDIT_THREADS', 4))
+preload_app = True
+
+
+def on_starting(server):
+    from app import warm_up
+
+    warm_up(start_scorer=False)
+    # Move the warmed objects out of the collector's reach so reference
+    # count updates during collection do not copy the shared pages
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    from app import start_batch_scoring
+
+    # Threads do not survive fork, so each worker runs its own scorer
+    start_batch_scoring()
@@ -0,0 +1,285 @@
+import base64
+import json
+import os
+import sqlite3
+import time
+
+# Path to the audit history database
+MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(MODEL_DIR, 'data')
+HISTORY_DB_PATH = os.path.join(DATA_DIR, 'audit_history.db')
+
+# Retention: audits older than this are dropped, and only the most recent
+# audits per target are kept
+RETENTION_DAYS = 365
+MAX_AUDITS_PER_TARGET = 500
+
+# Default and largest page of per-follower rows returned by the API
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS audits (
+    audit_id TEXT PRIMARY KEY,
+    target TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    authenticity_percent REAL,
+    sampled_followers INTEGER,
+    fake_followers INTEGER,
+    engagement_rate REAL,
+    posts_analyzed INTEGER,
+    follower_count INTEGER,
+    result_json TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_audits_target_time ON audits (target, created_at);
+CREATE INDEX IF NOT EXISTS idx_audits_time ON audits (created_at);
+CREATE TABLE IF NOT EXISTS audit_followers (
+    audit_id TEXT NOT NULL REFERENCES audits(audit_id),
+    target TEXT NOT NULL,
+    username TEXT NOT NULL,
+    is_fake INTEGER NOT NULL,
+    follower_count INTEGER,
+    following_count INTEGER,
+    PRIMARY KEY (audit_id, username)
+);
+CREATE INDEX IF NOT EXISTS idx_audit_followers_target_fake
+    ON audit_followers (target, is_fake, username);
+CREATE TABLE IF NOT EXISTS audit_churn (
+    audit_id TEXT NOT NULL REFERENCES audits(audit_id),
+    kind TEXT NOT NULL,
+    username TEXT NOT NULL,
+    PRIMARY KEY (audit_id, kind, username)
+);
+'''
+
+# Per-follower churn lists of a result, by the kind stored in audit_churn
+CHURN_LISTS = {
+    'gained': 'fake_followers_gained_usernames',
+    'lost': 'fake_followers_lost_usernames',
+}
+
+
+def connect(path=HISTORY_DB_PATH):
+    """
+    Open the history database, creating the schema if needed.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path)
+    # WAL lets the API read while an audit is being written
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def record_audit(result, follower_rows, conn=None, retention_days=RETENTION_DAYS,
+                 max_audits_per_target=MAX_AUDITS_PER_TARGET):
+    """
+    Store a successful audit and its per-follower rows in one transaction.
+
+    Args:
+        result: Result dictionary from run_audit
+        follower_rows: List of (username, is_fake, follower_count, following_count)
+            tuples; counts may be None for followers whose score was reused
+    """
+    close = conn is None
+    conn = conn or connect()
+    try:
+        follower_analysis = result['audit']['follower_analysis']
+        engagement_analysis = result['audit'].get('engagement_analysis', {})
+        target = result['username']
+        with conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO audits (audit_id, target, created_at, authenticity_percent, '
+                'sampled_followers, fake_followers, engagement_rate, posts_analyzed, '
+                'follower_count, result_json) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (result['audit_id'], target, time.time(),
+                 follower_analysis.get('authenticity_percent'),
+                 follower_analysis.get('sampled_followers'),
+                 follower_analysis.get('fake_followers'),
+                 engagement_analysis.get('engagement_rate'),
+                 engagement_analysis.get('posts_analyzed'),
+                 result['user_info'].get('follower_count'),
+                 json.dumps(result)))
+            conn.executemany(
+                'INSERT OR REPLACE INTO audit_followers (audit_id, target, username, is_fake, '
+                'follower_count, following_count) VALUES (?, ?, ?, ?, ?, ?)',
+                [(result['audit_id'], target) + tuple(row) for row in follower_rows])
+            churn = result['audit'].get('churn', {})
+            conn.executemany(
+                'INSERT OR REPLACE INTO audit_churn (audit_id, kind, username) VALUES (?, ?, ?)',
+                [(result['audit_id'], kind, username)
+                 for kind, field in CHURN_LISTS.items() for username in churn.get(field, [])])
+            apply_retention(conn, target, retention_days, max_audits_per_target)
+    finally:
+        if close:
+            conn.close()
+
+
+def apply_retention(conn, target, retention_days=RETENTION_DAYS,
+                    max_audits_per_target=MAX_AUDITS_PER_TARGET):
+    """
+    Drop audits older than the retention window and the oldest audits of a
+    target beyond its cap, along with their follower rows.
+
+    Returns:
+        Number of audits removed
+    """
+    cutoff = time.time() - retention_days * 24 * 60 * 60
+    expired = [row[0] for row in conn.execute(
+        'SELECT audit_id FROM audits WHERE created_at < ?', (cutoff,))]
+    expired += [row[0] for row in conn.execute(
+        'SELECT audit_id FROM audits WHERE target = ? AND created_at >= ? '
+        'ORDER BY created_at DESC LIMIT -1 OFFSET ?',
+        (target, cutoff, max_audits_per_target))]
+    if expired:
+        rows = [(audit_id,) for audit_id in expired]
+        conn.executemany('DELETE FROM audit_followers WHERE audit_id = ?', rows)
+        conn.executemany('DELETE FROM audit_churn WHERE audit_id = ?', rows)
+        conn.executemany('DELETE FROM audits WHERE audit_id = ?', rows)
+    return len(expired)
+
+
+def authenticity_series(conn, target, since=None, until=None, limit=None):
+    """
+    Authenticity time-series for a target, oldest first.
+
+    Returns:
+        List of dictionaries with the summary metrics of each audit
+    """
+    query = ('SELECT audit_id, created_at, authenticity_percent, sampled_followers, '
+             'fake_followers, engagement_rate, posts_analyzed, follower_count '
+             'FROM audits WHERE target = ? AND created_at >= ? AND created_at <= ? '
+             'ORDER BY created_at DESC')
+    params = [target, since or 0, until or time.time()]
+    if limit:
+        query += ' LIMIT ?'
+        params.append(limit)
+    columns = ['audit_id', 'created_at', 'authenticity_percent', 'sampled_followers',
+               'fake_followers', 'engagement_rate', 'posts_analyzed', 'follower_count']
+    rows = conn.execute(query, params).fetchall()
+    return [dict(zip(columns, row)) for row in reversed(rows)]
+
+
+def top_fake_followers(conn, target, limit=20):
+    """
+    Followers of a target flagged as fake most often across its audits.
+
+    Returns:
+        List of dictionaries with the username, how many audits flagged it
+        and its latest known follower/following counts
+    """
+    # Counts come from the most recent audit that fetched the follower's
+    # profile (reused scores store no counts)
+    rows = conn.execute(
+        'WITH flagged AS ('
+        '  SELECT username, COUNT(*) AS times_flagged FROM audit_followers '
+        '  WHERE target = ? AND is_fake = 1 '
+        '  GROUP BY username ORDER BY times_flagged DESC, username LIMIT ?), '
+        'latest AS ('
+        '  SELECT f.username, f.follower_count, f.following_count, '
+        '    ROW_NUMBER() OVER (PARTITION BY f.username ORDER BY a.created_at DESC) AS rank '
+        '  FROM audit_followers f JOIN audits a ON a.audit_id = f.audit_id '
+        '  WHERE f.target = ? AND f.follower_count IS NOT NULL '
+        '  AND f.username IN (SELECT username FROM flagged)) '
+        'SELECT flagged.username, times_flagged, latest.follower_count, latest.following_count '
+        'FROM flagged LEFT JOIN latest ON latest.username = flagged.username AND latest.rank = 1 '
+        'ORDER BY times_flagged DESC, flagged.username',
+        (target, limit, target)).fetchall()
+    return [
+        {'username': username, 'times_flagged': times_flagged,
+         'follower_count': follower_count, 'following_count': following_count}
+        for username, times_flagged, follower_count, following_count in rows
+    ]
+
+
+def get_audit(conn, audit_id):
+    """The stored result of one audit, or None"""
+    row = conn.execute(
+        'SELECT result_json FROM audits WHERE audit_id = ?', (audit_id,)).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def encode_cursor(username):
+    """Opaque pagination cursor pointing just after a username"""
+    return base64.urlsafe_b64encode(username.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Username encoded in a cursor; raises ValueError for malformed cursors"""
+    padded = cursor + '=' * (-len(cursor) % 4)
+    try:
+        # validate=True rejects characters outside the URL-safe alphabet
+        # instead of silently dropping them
+        return base64.b64decode(padded.encode('ascii'), altchars=b'-_',
+                                validate=True).decode('utf-8')
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+
+def _keyset_page(conn, query, params, cursor, limit):
+    """Run a username-ordered page query; returns (usernames, next_cursor)"""
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    after = decode_cursor(cursor) if cursor else ''
+    rows = conn.execute(query, tuple(params) + (after, limit + 1)).fetchall()
+    usernames = [row[0] for row in rows[:limit]]
+    next_cursor = encode_cursor(usernames[-1]) if len(rows) > limit else None
+    return usernames, next_cursor
+
+
+def fake_followers_page(conn, audit_id, cursor=None, limit=PAGE_SIZE):
+    """
+    One page of an audit's fake followers, ordered by username.
+
+    Uses keyset pagination on the (audit_id, username) primary key, so every
+    page costs the same regardless of its position.
+
+    Returns:
+        Tuple of (usernames, next_cursor); next_cursor is None on the last page
+    """
+    return _keyset_page(
+        conn,
+        'SELECT username FROM audit_followers WHERE audit_id = ? AND is_fake = 1 '
+        'AND username > ? ORDER BY username LIMIT ?',
+        (audit_id,), cursor, limit)
+
+
+def churn_page(conn, audit_id, kind, cursor=None, limit=PAGE_SIZE):
+    """
+    One page of the fake followers an audit gained or lost, ordered by username.
+
+    Returns:
+        Tuple of (usernames, next_cursor); next_cursor is None on the last page
+    """
+    if kind not in CHURN_LISTS:
+        raise ValueError(f"Unknown churn list: {kind}")
+    return _keyset_page(
+        conn,
+        'SELECT username FROM audit_churn WHERE audit_id = ? AND kind = ? '
+        'AND username > ? ORDER BY username LIMIT ?',
+        (audit_id, kind), cursor, limit)
+
+
+def paginate_result(conn, result, limit=PAGE_SIZE):
+    """
+    Replace the full per-follower lists of a result with their first pages.
+
+    The remaining pages are served by fake_followers_page and churn_page
+    using the returned '<list>_next_cursor' values.
+    """
+    if 'audit_id' not in result:
+        return result
+    audit = result.get('audit', {})
+
+    follower_analysis = audit.get('follower_analysis', {})
+    if 'fake_follower_usernames' in follower_analysis:
+        usernames, next_cursor = fake_followers_page(conn, result['audit_id'], None, limit)
+        follower_analysis['fake_follower_usernames'] = usernames
+        follower_analysis['fake_followers_next_cursor'] = next_cursor
+
+    churn = audit.get('churn', {})
+    for kind, field in CHURN_LISTS.items():
+        if field in churn:
+            usernames, next_cursor = churn_page(conn, result['audit_id'], kind, None, limit)
+            churn[field] = usernames
+            churn[field.replace('_usernames', '_next_cursor')] = next_cursor
+    return result
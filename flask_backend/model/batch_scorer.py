@@ -0,0 +1,166 @@
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+# Flush a batch once it holds this many rows or its oldest request waited this long
+MAX_BATCH_SIZE = 256
+MAX_WAIT_MS = 5.0
+
+# Number of recent batches kept for the metrics
+METRICS_WINDOW = 1000
+
+
+class MicroBatchScorer:
+    """
+    Collects feature rows from concurrent audits and scores them in shared batches.
+
+    Callers submit a list of feature dictionaries and get a Future back. A
+    background thread merges pending requests into one model call when the
+    batch reaches max_batch_size rows or the oldest request has waited
+    max_wait_ms, then routes each caller's slice of the predictions back.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._thread = None
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._rows = 0
+        self._batch_sizes = deque(maxlen=METRICS_WINDOW)
+        self._queue_waits = deque(maxlen=METRICS_WINDOW)
+        self._predict_times = deque(maxlen=METRICS_WINDOW)
+
+    def start(self):
+        """Start the background batching thread"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping.clear()
+            self._thread = threading.Thread(
+                target=self._run, name='micro-batch-scorer', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Flush pending requests and stop the background thread"""
+        self._stopping.set()
+        self._queue.put(None)
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def submit(self, features_list):
+        """
+        Queue feature rows for scoring.
+
+        Args:
+            features_list: List of dictionaries from prepare_follower_features
+
+        Returns:
+            Future resolving to the list of 0/1 predictions for these rows
+        """
+        future = Future()
+        if not features_list:
+            future.set_result([])
+            return future
+        self._queue.put((features_list, future, time.perf_counter()))
+        return future
+
+    def predict(self, features_list, timeout=None):
+        """Submit rows and block until their predictions are ready"""
+        return self.submit(features_list).result(timeout)
+
+    def _next_batch(self):
+        """Block for the first request, then gather more until a flush trigger fires"""
+        first = self._queue.get()
+        if first is None:
+            return []
+        batch = [first]
+        rows = len(first[0])
+        deadline = first[2] + self.max_wait
+        while rows < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._stopping.set()
+                break
+            batch.append(item)
+            rows += len(item[0])
+        return batch
+
+    def _run(self):
+        while not (self._stopping.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            if batch:
+                self._score(batch)
+
+    def _score(self, batch):
+        flushed_at = time.perf_counter()
+        rows = [row for features_list, _, _ in batch for row in features_list]
+        try:
+            predictions = self.predict_fn(rows)
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+        predict_time = time.perf_counter() - flushed_at
+
+        # Route each caller's slice of the batch back through its future
+        offset = 0
+        for features_list, future, _ in batch:
+            future.set_result(predictions[offset:offset + len(features_list)])
+            offset += len(features_list)
+
+        with self._lock:
+            self._batches += 1
+            self._rows += len(rows)
+            self._batch_sizes.append(len(rows))
+            self._predict_times.append(predict_time)
+            self._queue_waits.extend(flushed_at - enqueued_at for _, _, enqueued_at in batch)
+
+    def metrics(self):
+        """
+        Batch-size and queue-wait statistics over the recent window.
+        """
+        with self._lock:
+            batch_sizes = np.array(self._batch_sizes, dtype=np.float64)
+            waits = np.array(self._queue_waits, dtype=np.float64) * 1000
+            predict_times = np.array(self._predict_times, dtype=np.float64) * 1000
+            batches, rows = self._batches, self._rows
+
+        def percentiles(values):
+            if len(values) == 0:
+                return {'p50': 0.0, 'p95': 0.0, 'max': 0.0}
+            return {
+                'p50': float(np.percentile(values, 50)),
+                'p95': float(np.percentile(values, 95)),
+                'max': float(values.max()),
+            }
+
+        return {
+            'running': self.running,
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000,
+            'queued_requests': self._queue.qsize(),
+            'batches': batches,
+            'rows': rows,
+            'mean_batch_size': float(batch_sizes.mean()) if len(batch_sizes) else 0.0,
+            'batch_size': percentiles(batch_sizes),
+            'queue_wait_ms': percentiles(waits),
+            'predict_ms': percentiles(predict_times),
+        }
@@ -0,0 +1,174 @@
+import os
+import time
+
+try:
+    import psutil
+except ImportError:  # Optional: fall back to /proc on Linux
+    psutil = None
+
+# Open a fresh page after this many navigations on the same page
+MAX_NAVIGATIONS_PER_PAGE = 25
+# Replace the whole browser context after this many page recycles
+MAX_PAGES_PER_CONTEXT = 8
+# Recycle the context early when the browser's processes grow past this
+MAX_BROWSER_RSS_MB = 1500
+# Navigations after a context recycle before memory may trigger another one
+RSS_RECYCLE_COOLDOWN = 10
+
+JS_HEAP_SCRIPT = '''() => performance.memory ? performance.memory.usedJSHeapSize : null'''
+
+
+def _pid_rss_bytes(pid):
+    """Resident memory of one process, or None if it cannot be read"""
+    if psutil is not None:
+        try:
+            return psutil.Process(pid).memory_info().rss
+        except psutil.Error:
+            return None
+    try:
+        with open(f'/proc/{pid}/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def browser_pids(cdp_session):
+    """PIDs of the browser, renderer, GPU and utility processes of one Chromium"""
+    info = cdp_session.send('SystemInfo.getProcessInfo')
+    return [process['id'] for process in info.get('processInfo', [])]
+
+
+def browser_rss_mb(cdp_session):
+    """
+    Resident memory in MB of the processes of one Chromium instance, or None
+    when it cannot be measured.
+
+    Only the processes reported by the browser itself are counted, so the
+    server process and other audits' browsers do not affect the result.
+    """
+    try:
+        pids = browser_pids(cdp_session)
+    except Exception:
+        return None
+    sizes = [size for size in map(_pid_rss_bytes, pids) if size is not None]
+    if not sizes:
+        return None
+    return sum(sizes) / (1024 * 1024)
+
+
+class PageGovernor:
+    """
+    Recycles the Playwright page and context of a long-running scraping session.
+
+    The governor owns client["page"] and client["context"]. Call
+    after_navigation() after each page.goto; once a page has served
+    max_navigations profiles it is replaced by a fresh page in the same
+    context, and after max_pages_per_context pages (or when the browser's
+    processes exceed max_rss_mb) the context itself is rebuilt from the old
+    context's storage state so the login session is kept. A memory-triggered
+    recycle waits rss_cooldown navigations after the previous context
+    recycle, so a browser that stays above the limit is not rebuilt on every
+    navigation.
+    """
+
+    def __init__(self, client, max_navigations=MAX_NAVIGATIONS_PER_PAGE,
+                 max_pages_per_context=MAX_PAGES_PER_CONTEXT, max_rss_mb=MAX_BROWSER_RSS_MB,
+                 rss_cooldown=RSS_RECYCLE_COOLDOWN):
+        self.client = client
+        self.max_navigations = max_navigations
+        self.max_pages_per_context = max_pages_per_context
+        self.max_rss_mb = max_rss_mb
+        self.rss_cooldown = rss_cooldown
+        self.navigations = 0
+        self.page_navigations = 0
+        self.context_navigations = 0
+        self.context_pages = 1
+        self.page_recycles = 0
+        self.context_recycles = 0
+        self.memory_recycles = 0
+        self.started_at = time.time()
+        self.rss_samples = []
+        self.js_heap_samples = []
+        self._cdp_session = None
+
+    def _browser_rss_mb(self):
+        """Memory of this session's browser, via a browser-level CDP session"""
+        if self._cdp_session is None:
+            try:
+                self._cdp_session = self.client["browser"].new_browser_cdp_session()
+            except Exception:
+                # Not Chromium, or CDP unavailable: memory is not measured
+                self._cdp_session = False
+        if not self._cdp_session:
+            return None
+        return browser_rss_mb(self._cdp_session)
+
+    @property
+    def page(self):
+        return self.client["page"]
+
+    def after_navigation(self):
+        """
+        Record a navigation, sample memory and recycle if a threshold is hit.
+        """
+        self.navigations += 1
+        self.page_navigations += 1
+        self.context_navigations += 1
+
+        rss = self._browser_rss_mb()
+        if rss is not None:
+            self.rss_samples.append(rss)
+        try:
+            heap = self.page.evaluate(JS_HEAP_SCRIPT)
+            if heap is not None:
+                self.js_heap_samples.append(heap / (1024 * 1024))
+        except Exception:
+            pass
+
+        if (rss is not None and rss > self.max_rss_mb
+                and self.context_navigations >= self.rss_cooldown):
+            print(f"  Browser memory at {rss:.0f} MB, recycling context...")
+            self.recycle_context()
+            self.memory_recycles += 1
+        elif self.page_navigations >= self.max_navigations:
+            if self.context_pages >= self.max_pages_per_context:
+                self.recycle_context()
+            else:
+                self.recycle_page()
+
+    def recycle_page(self):
+        """Replace the current page with a fresh one in the same context"""
+        old_page = self.client["page"]
+        self.client["page"] = self.client["context"].new_page()
+        old_page.close()
+        self.page_navigations = 0
+        self.context_pages += 1
+        self.page_recycles += 1
+
+    def recycle_context(self):
+        """Rebuild the browser context, carrying over cookies and local storage"""
+        old_context = self.client["context"]
+        storage_state = old_context.storage_state()
+        context = self.client["browser"].new_context(
+            storage_state=storage_state, **self.client.get("context_options", {}))
+        page = context.new_page()
+        old_context.close()
+        self.client["context"] = context
+        self.client["page"] = page
+        self.page_navigations = 0
+        self.context_navigations = 0
+        self.context_pages = 1
+        self.context_recycles += 1
+
+    def report(self):
+        """Memory and recycling statistics for the session"""
+        return {
+            'navigations': self.navigations,
+            'page_recycles': self.page_recycles,
+            'context_recycles': self.context_recycles,
+            'memory_recycles': self.memory_recycles,
+            'duration_seconds': time.time() - self.started_at,
+            'rss_mb_last': self.rss_samples[-1] if self.rss_samples else None,
+            'rss_mb_peak': max(self.rss_samples) if self.rss_samples else None,
+            'js_heap_mb_peak': max(self.js_heap_samples) if self.js_heap_samples else None,
+        }
@@ -0,0 +1,350 @@
+import argparse
+import json
+import os
+import shutil
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from feature_store import FEATURE_COLUMNS
+
+LABEL_COLUMN = 'fake'
+
+# Fixed on-disk dtype of every column of the labelled dataset
+COLUMN_DTYPES = {
+    'profile pic': np.int8,
+    'nums/length username': np.float64,
+    'fullname words': np.int32,
+    'nums/length fullname': np.float64,
+    'name==username': np.int8,
+    'description length': np.int32,
+    'external URL': np.int8,
+    'private': np.int8,
+    '#posts': np.int64,
+    '#followers': np.int64,
+    '#follows': np.int64,
+    LABEL_COLUMN: np.int8,
+}
+DATASET_COLUMNS = FEATURE_COLUMNS + [LABEL_COLUMN]
+BINARY_COLUMNS = ['profile pic', 'name==username', 'external URL', 'private', LABEL_COLUMN]
+
+# Each build of a cache lives in its own directory named by CURRENT
+CURRENT_FILE = 'CURRENT'
+KEEP_OLD_VERSIONS = 2
+# Lock file serializing builds and appends across processes
+LOCK_FILE = '.lock'
+LOCK_TIMEOUT_SECONDS = 300
+LOCK_STALE_SECONDS = 600
+
+
+class SchemaError(ValueError):
+    """Raised when labelled data does not match the expected schema"""
+
+
+def validate_schema(df):
+    """
+    Check labelled rows against the 11 feature columns plus the label.
+
+    Returns:
+        The rows with columns in canonical order and cast to their fixed dtypes
+
+    Raises:
+        SchemaError: On missing or unexpected columns, missing values,
+            non-binary flags or negative counts
+    """
+    missing = [c for c in DATASET_COLUMNS if c not in df.columns]
+    unexpected = [c for c in df.columns if c not in COLUMN_DTYPES]
+    if missing or unexpected:
+        raise SchemaError(f"Missing columns: {missing}, unexpected columns: {unexpected}")
+
+    df = df[DATASET_COLUMNS]
+    if df.isna().any().any():
+        raise SchemaError(
+            f"Missing values in columns: {df.columns[df.isna().any()].tolist()}")
+    for column in BINARY_COLUMNS:
+        if not df[column].isin([0, 1]).all():
+            raise SchemaError(f"Column {column!r} must only contain 0 or 1")
+    if (df[FEATURE_COLUMNS] < 0).any().any():
+        raise SchemaError("Feature values must not be negative")
+
+    return df.astype(COLUMN_DTYPES)
+
+
+def cache_dir_for(csv_path):
+    """Directory holding the binary cache of a CSV file"""
+    directory, name = os.path.split(os.path.abspath(csv_path))
+    return os.path.join(directory, 'cache', os.path.splitext(name)[0])
+
+
+def _column_path(version_dir, index):
+    return os.path.join(version_dir, f'col_{index:02d}.bin')
+
+
+def _source_signature(csv_path):
+    stat = os.stat(csv_path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+@contextmanager
+def _locked(cache_dir, timeout=LOCK_TIMEOUT_SECONDS):
+    """
+    Hold the cache's lock file so builds and appends of different processes
+    do not interleave. A lock older than LOCK_STALE_SECONDS is assumed to be
+    left by a crashed process and broken.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    lock_path = os.path.join(cache_dir, LOCK_FILE)
+    deadline = time.time() + timeout
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.stat(lock_path).st_mtime > LOCK_STALE_SECONDS:
+                    os.remove(lock_path)
+                    continue
+            except FileNotFoundError:
+                continue
+            if time.time() > deadline:
+                raise TimeoutError(f"Dataset cache {cache_dir} is locked")
+            time.sleep(0.05)
+    try:
+        os.write(fd, str(os.getpid()).encode('ascii'))
+        os.close(fd)
+        yield
+    finally:
+        os.remove(lock_path)
+
+
+def current_version(cache_dir):
+    """Name of the live build of a cache, or None if it has not been built"""
+    try:
+        with open(os.path.join(cache_dir, CURRENT_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _read_meta(cache_dir):
+    """Metadata of the live build, or None"""
+    version = current_version(cache_dir)
+    if version is None:
+        return None
+    with open(os.path.join(cache_dir, version, 'meta.json')) as f:
+        return json.load(f)
+
+
+def _publish(cache_dir, version_dir, meta):
+    """
+    Make a fully written build the live one.
+
+    Builds are never modified once published: readers keep mapping the
+    build they opened, and the CURRENT pointer is swapped with one
+    os.replace.
+    """
+    version = os.path.basename(version_dir)
+    meta['version'] = version
+    with open(os.path.join(version_dir, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+    tmp_path = os.path.join(cache_dir, CURRENT_FILE + '.tmp')
+    with open(tmp_path, 'w') as f:
+        f.write(version)
+    os.replace(tmp_path, os.path.join(cache_dir, CURRENT_FILE))
+
+    # Keep a few earlier builds for readers still opening them; removal of
+    # a build that is still mapped fails on Windows and is retried next time
+    versions = sorted(
+        (name for name in os.listdir(cache_dir)
+         if name.startswith('v') and name[1:].isdigit() and name != version),
+        key=lambda name: int(name[1:]))
+    for name in versions[:max(0, len(versions) - KEEP_OLD_VERSIONS)]:
+        shutil.rmtree(os.path.join(cache_dir, name), ignore_errors=True)
+
+
+def _new_version_dir(cache_dir):
+    version_dir = os.path.join(cache_dir, f'v{time.time_ns()}')
+    os.makedirs(version_dir)
+    return version_dir
+
+
+def _write_columns(version_dir, df, mode='wb'):
+    """Write (mode 'wb') or append (mode 'ab') rows to a build's column files"""
+    for index, column in enumerate(DATASET_COLUMNS):
+        dtype = np.dtype(COLUMN_DTYPES[column])
+        with open(_column_path(version_dir, index), mode) as f:
+            f.write(np.ascontiguousarray(df[column].to_numpy(dtype=dtype)).tobytes())
+
+
+def build_cache(csv_path, cache_dir=None):
+    """
+    Parse and validate a CSV once and write it as fixed-dtype column files.
+
+    Rows appended to an earlier cache of the same CSV are carried over.
+
+    Returns:
+        The cache metadata
+    """
+    cache_dir = cache_dir or cache_dir_for(csv_path)
+
+    try:
+        df = pd.read_csv(csv_path, dtype=COLUMN_DTYPES)
+    except ValueError as e:
+        raise SchemaError(f"{csv_path} does not match the dataset schema: {e}")
+    df = validate_schema(df)
+
+    with _locked(cache_dir):
+        previous = _read_meta(cache_dir)
+        previous_dir = os.path.join(cache_dir, previous['version']) if previous else None
+        legacy_meta = os.path.join(cache_dir, 'meta.json')
+        if previous is None and os.path.exists(legacy_meta):
+            # Cache written before builds were versioned
+            with open(legacy_meta) as f:
+                previous = json.load(f)
+            previous_dir = cache_dir
+        if previous and previous['rows'] > previous['base_rows']:
+            appended = _map_columns(previous_dir, previous)
+            tail = pd.DataFrame({c: np.array(appended[c][previous['base_rows']:])
+                                 for c in DATASET_COLUMNS})
+            del appended
+            df = pd.concat([df, tail], ignore_index=True)
+            base_rows = len(df) - len(tail)
+        else:
+            base_rows = len(df)
+
+        version_dir = _new_version_dir(cache_dir)
+        _write_columns(version_dir, df)
+        meta = {
+            'columns': DATASET_COLUMNS,
+            'dtypes': [np.dtype(COLUMN_DTYPES[c]).str for c in DATASET_COLUMNS],
+            'rows': len(df),
+            'base_rows': base_rows,
+            'source': _source_signature(csv_path),
+            'built_at': time.time(),
+        }
+        _publish(cache_dir, version_dir, meta)
+        if previous_dir == cache_dir:
+            for name in os.listdir(cache_dir):
+                if name == 'meta.json' or (name.startswith('col_') and name.endswith('.bin')):
+                    try:
+                        os.remove(os.path.join(cache_dir, name))
+                    except OSError:
+                        pass
+    return meta
+
+
+def load_columns(cache_dir):
+    """
+    Memory-map every column of the live build of a cache.
+
+    Returns:
+        Dictionary of column name -> read-only array
+    """
+    version = current_version(cache_dir)
+    if version is None:
+        raise FileNotFoundError(f"No dataset cache in {cache_dir}")
+    version_dir = os.path.join(cache_dir, version)
+    with open(os.path.join(version_dir, 'meta.json')) as f:
+        meta = json.load(f)
+    return _map_columns(version_dir, meta)
+
+
+def _map_columns(version_dir, meta):
+    columns = {}
+    for index, (column, dtype) in enumerate(zip(meta['columns'], meta['dtypes'])):
+        if meta['rows'] == 0:
+            columns[column] = np.empty(0, dtype=dtype)
+        else:
+            columns[column] = np.memmap(_column_path(version_dir, index), dtype=dtype,
+                                        mode='r', shape=(meta['rows'],))
+    return columns
+
+
+def ensure_cache(csv_path, cache_dir=None):
+    """
+    Return the cache directory of a CSV, rebuilding it if the CSV changed.
+
+    If the CSV is gone but a cache exists, the cache is used as is.
+    """
+    cache_dir = cache_dir or cache_dir_for(csv_path)
+    meta = _read_meta(cache_dir)
+    if not os.path.exists(csv_path):
+        if meta is None:
+            raise FileNotFoundError(csv_path)
+        return cache_dir
+    if meta is None or meta['source'] != _source_signature(csv_path):
+        print(f"Building dataset cache for {csv_path}...")
+        build_cache(csv_path, cache_dir)
+    return cache_dir
+
+
+def load_training_data(csv_path, cache_dir=None):
+    """
+    Load labelled data through the binary cache.
+
+    Returns:
+        Tuple of (features DataFrame, labels array)
+    """
+    columns = load_columns(ensure_cache(csv_path, cache_dir))
+    train_X = pd.DataFrame({c: columns[c] for c in FEATURE_COLUMNS}, columns=FEATURE_COLUMNS)
+    return train_X, np.asarray(columns[LABEL_COLUMN])
+
+
+def append_rows(csv_path, rows, cache_dir=None):
+    """
+    Append newly labelled rows to the cache of a CSV without re-parsing it.
+
+    The live build's column files are copied byte for byte into a new build
+    and the rows appended there, so processes mapping the live build are
+    never affected. Appends are serialized by the cache's lock file.
+
+    Args:
+        csv_path: CSV the cache belongs to
+        rows: DataFrame or list of dictionaries with the dataset columns
+
+    Returns:
+        Total number of rows in the cache
+    """
+    cache_dir = ensure_cache(csv_path, cache_dir)
+    df = validate_schema(pd.DataFrame(rows))
+    with _locked(cache_dir):
+        meta = _read_meta(cache_dir)
+        live_dir = os.path.join(cache_dir, meta['version'])
+        version_dir = _new_version_dir(cache_dir)
+        for index in range(len(DATASET_COLUMNS)):
+            source = _column_path(live_dir, index)
+            if os.path.exists(source):
+                shutil.copyfile(source, _column_path(version_dir, index))
+        _write_columns(version_dir, df, 'ab')
+        meta['rows'] += len(df)
+        _publish(cache_dir, version_dir, meta)
+    return meta['rows']
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Manage the binary cache of a labelled dataset')
+    parser.add_argument('command', choices=['build', 'append', 'info'])
+    parser.add_argument('csv', help='Labelled CSV the cache belongs to')
+    parser.add_argument('rows', nargs='?', help='CSV of new rows (append only)')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        meta = build_cache(args.csv)
+        print(f"Cached {meta['rows']} rows in {cache_dir_for(args.csv)}")
+    elif args.command == 'append':
+        if not args.rows:
+            parser.error('append needs a CSV of new rows')
+        total = append_rows(args.csv, pd.read_csv(args.rows))
+        print(f"Cache now holds {total} rows")
+    else:
+        start = time.perf_counter()
+        train_X, train_Y = load_training_data(args.csv)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"{len(train_X)} rows ({int(train_Y.sum())} fake) loaded in {elapsed:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
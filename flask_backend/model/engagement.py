@@ -0,0 +1,171 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Bounds on post collection
+MAX_POSTS = 20
+POSTS_PER_PAGE = 12
+MAX_POST_PAGES = 3
+
+# Instagram web API endpoint for a user's feed and the app id the web client sends
+FEED_URL = "https://www.instagram.com/api/v1/feed/user/{username}/username/"
+PROFILE_URL = "https://www.instagram.com/api/v1/users/web_profile_info/"
+IG_APP_ID = "936619743392459"
+REQUEST_TIMEOUT_MS = 30000
+
+
+def calculate_engagement_rate(like_counts, comment_counts, follower_count):
+    """
+    Calculate engagement rate based on likes and comments.
+
+    Args:
+        like_counts: Like count per post
+        comment_counts: Comment count per post
+        follower_count: Number of followers of the account
+
+    Returns:
+        Average engagement per post as a percentage of followers
+    """
+    likes = np.asarray(like_counts, dtype=np.float64)
+    comments = np.asarray(comment_counts, dtype=np.float64)
+    if likes.size == 0 or not follower_count:
+        return 0.0
+    return float((likes + comments).mean() / follower_count * 100)
+
+
+def fetch_posts(request_context, username, max_posts=MAX_POSTS, max_pages=MAX_POST_PAGES):
+    """
+    Page through a user's feed through the web API, up to max_pages pages.
+
+    Pages are fetched one after another: each page's cursor (next_max_id)
+    only arrives with the previous response, so there is nothing to prefetch.
+
+    Args:
+        request_context: Playwright APIRequestContext carrying the login cookies
+        username: Account whose posts to fetch
+
+    Returns:
+        Tuple of (like_counts, comment_counts) arrays for up to max_posts posts
+    """
+    like_counts = []
+    comment_counts = []
+    max_id = None
+
+    for _ in range(max_pages):
+        params = {"count": POSTS_PER_PAGE}
+        if max_id:
+            params["max_id"] = max_id
+        response = request_context.get(
+            FEED_URL.format(username=username), params=params, timeout=REQUEST_TIMEOUT_MS)
+        if not response.ok:
+            print(f"  Feed request for {username} failed with status {response.status}")
+            break
+
+        feed = response.json()
+        for item in feed.get('items', []):
+            like_counts.append(item.get('like_count') or 0)
+            comment_counts.append(item.get('comment_count') or 0)
+
+        max_id = feed.get('next_max_id')
+        if len(like_counts) >= max_posts or not feed.get('more_available') or not max_id:
+            break
+
+    return (np.asarray(like_counts[:max_posts], dtype=np.int64),
+            np.asarray(comment_counts[:max_posts], dtype=np.int64))
+
+
+def fetch_follower_count(request_context, username):
+    """
+    Exact follower count from the web API profile info.
+
+    The profile header abbreviates large counts ("12.5K"), which is too
+    coarse for a denominator.
+
+    Returns:
+        The follower count, or None if the request fails
+    """
+    response = request_context.get(
+        PROFILE_URL, params={"username": username}, timeout=REQUEST_TIMEOUT_MS)
+    if not response.ok:
+        print(f"  Profile info request for {username} failed with status {response.status}")
+        return None
+    try:
+        user = response.json().get('data', {}).get('user') or {}
+        return user.get('edge_followed_by', {}).get('count')
+    except (ValueError, AttributeError) as e:
+        print(f"  Unexpected profile info response for {username}: {e}")
+        return None
+
+
+def collect_engagement(storage_state, context_options, username, follower_count):
+    """
+    Collect engagement metrics in a separate Playwright session.
+
+    Playwright objects cannot be shared across threads, so this starts its
+    own API request context seeded with the logged-in session's storage
+    state. The feed is read through the web API, so no browser is launched.
+
+    Returns:
+        Dictionary with the engagement rate and post statistics
+    """
+    # Imported here so scoring-only processes never load Playwright
+    from playwright.sync_api import sync_playwright
+
+    with sync_playwright() as playwright:
+        request_context = playwright.request.new_context(
+            storage_state=storage_state,
+            user_agent=context_options.get("user_agent"),
+            extra_http_headers={"X-IG-App-ID": IG_APP_ID})
+        try:
+            exact_count = fetch_follower_count(request_context, username)
+            like_counts, comment_counts = fetch_posts(request_context, username)
+        finally:
+            request_context.dispose()
+
+    # Fall back to the count parsed from the profile header
+    if exact_count:
+        follower_count = exact_count
+
+    return {
+        'engagement_rate': calculate_engagement_rate(like_counts, comment_counts, follower_count),
+        'posts_analyzed': int(like_counts.size),
+        'follower_count': follower_count,
+        'avg_likes': float(like_counts.mean()) if like_counts.size else 0.0,
+        'avg_comments': float(comment_counts.mean()) if comment_counts.size else 0.0,
+    }
+
+
+def start_engagement_collection(client, username, follower_count):
+    """
+    Start collecting engagement in the background while followers are sampled.
+
+    Args:
+        client: Logged-in client from get_instagram_client
+        username: Account to analyse
+        follower_count: Follower count from the account's profile
+
+    Returns:
+        Tuple of (executor, future); the future resolves to collect_engagement's result
+    """
+    storage_state = client["context"].storage_state()
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='engagement')
+    future = executor.submit(
+        collect_engagement, storage_state, client.get("context_options", {}),
+        username, follower_count)
+    return executor, future
+
+
+def finish_engagement_collection(executor, future, timeout=None):
+    """
+    Wait for the background engagement collection.
+
+    Returns:
+        The engagement metrics, or zeroed metrics with the error if collection failed
+    """
+    try:
+        return future.result(timeout)
+    except Exception as e:
+        print(f"\nEngagement analysis failed: {e}")
+        return {'engagement_rate': 0, 'posts_analyzed': 0, 'error': str(e)}
+    finally:
+        executor.shutdown(wait=False)
@@ -0,0 +1,276 @@
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+from profiling import profiled, span
+
+# Paths to the feature store
+MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(MODEL_DIR, 'data')
+FEATURE_STORE_DIR = os.path.join(DATA_DIR, 'feature_store')
+FEATURE_MATRIX_PATH = os.path.join(FEATURE_STORE_DIR, 'features.f64')
+FEATURE_INDEX_PATH = os.path.join(FEATURE_STORE_DIR, 'index.db')
+
+# Column order of the stored feature vectors (matches the training data)
+FEATURE_COLUMNS = [
+    'profile pic',
+    'nums/length username',
+    'fullname words',
+    'nums/length fullname',
+    'name==username',
+    'description length',
+    'external URL',
+    'private',
+    '#posts',
+    '#followers',
+    '#follows',
+]
+FEATURE_DTYPE = np.float64
+ROW_BYTES = len(FEATURE_COLUMNS) * np.dtype(FEATURE_DTYPE).itemsize
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS feature_rows (
+    row_id INTEGER PRIMARY KEY,
+    username TEXT NOT NULL,
+    profile_hash TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    UNIQUE (username, profile_hash)
+);
+CREATE INDEX IF NOT EXISTS idx_feature_rows_username ON feature_rows (username, row_id);
+CREATE TABLE IF NOT EXISTS audits (
+    audit_id TEXT PRIMARY KEY,
+    target TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS audit_features (
+    audit_id TEXT NOT NULL REFERENCES audits(audit_id),
+    row_id INTEGER NOT NULL REFERENCES feature_rows(row_id),
+    PRIMARY KEY (audit_id, row_id)
+);
+CREATE TABLE IF NOT EXISTS rescores (
+    audit_id TEXT NOT NULL REFERENCES audits(audit_id),
+    model_id TEXT NOT NULL,
+    sample_size INTEGER NOT NULL,
+    fake_followers INTEGER NOT NULL,
+    authenticity_percent REAL NOT NULL,
+    rescored_at REAL NOT NULL,
+    PRIMARY KEY (audit_id, model_id)
+);
+'''
+
+
+def connect(path=FEATURE_INDEX_PATH):
+    """
+    Open the feature store index, creating the schema if needed.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def profile_hash(features):
+    """
+    Hash a feature dictionary so unchanged profiles share one stored row.
+    """
+    payload = json.dumps([features[c] for c in FEATURE_COLUMNS])
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def stored_row_count(matrix_path=FEATURE_MATRIX_PATH):
+    """Number of feature vectors in the matrix file"""
+    if not os.path.exists(matrix_path):
+        return 0
+    return os.path.getsize(matrix_path) // ROW_BYTES
+
+
+def store_audit_features(audit_id, target, usernames, features_list, reused_usernames=(),
+                         conn=None, matrix_path=FEATURE_MATRIX_PATH):
+    """
+    Persist the feature vectors used by an audit and record their provenance.
+
+    Vectors already stored for the same username and profile hash are not
+    written again. Followers whose score was reused from an earlier audit
+    are linked to their most recent stored vector.
+
+    Args:
+        audit_id: Identifier of the audit
+        target: Audited username
+        usernames: Usernames of the followers scored in this audit
+        features_list: Feature dictionaries from prepare_follower_features
+        reused_usernames: Usernames whose earlier score was reused
+
+    Returns:
+        Number of new feature vectors appended to the store
+    """
+    close = conn is None
+    conn = conn or connect()
+    try:
+        with conn:
+            conn.execute(
+                'INSERT OR IGNORE INTO audits (audit_id, target, created_at) VALUES (?, ?, ?)',
+                (audit_id, target, time.time()))
+
+            row_ids = []
+            new_rows = []
+            pending = {}
+            next_row = stored_row_count(matrix_path)
+            for username, features in zip(usernames, features_list):
+                key = profile_hash(features)
+                row = conn.execute(
+                    'SELECT row_id FROM feature_rows WHERE username = ? AND profile_hash = ?',
+                    (username, key)).fetchone()
+                if row is None:
+                    if (username, key) not in pending:
+                        pending[(username, key)] = next_row
+                        next_row += 1
+                        new_rows.append([features[c] for c in FEATURE_COLUMNS])
+                    row = (pending[(username, key)],)
+                row_ids.append(row[0])
+
+            for username in reused_usernames:
+                row = conn.execute(
+                    'SELECT MAX(row_id) FROM feature_rows WHERE username = ?',
+                    (username,)).fetchone()
+                if row[0] is not None:
+                    row_ids.append(row[0])
+
+            # Append the vectors before indexing them so every indexed row exists
+            if new_rows:
+                os.makedirs(os.path.dirname(matrix_path), exist_ok=True)
+                with open(matrix_path, 'ab') as f:
+                    f.write(np.asarray(new_rows, dtype=FEATURE_DTYPE).tobytes())
+                created_at = time.time()
+                conn.executemany(
+                    'INSERT INTO feature_rows (row_id, username, profile_hash, created_at) '
+                    'VALUES (?, ?, ?, ?)',
+                    [(row_id, username, key, created_at)
+                     for (username, key), row_id in pending.items()])
+
+            conn.executemany(
+                'INSERT OR IGNORE INTO audit_features (audit_id, row_id) VALUES (?, ?)',
+                [(audit_id, row_id) for row_id in row_ids])
+    finally:
+        if close:
+            conn.close()
+
+    return len(new_rows)
+
+
+def load_feature_matrix(matrix_path=FEATURE_MATRIX_PATH):
+    """
+    Memory-map every stored feature vector as a read-only (rows, 11) matrix.
+    """
+    n_rows = stored_row_count(matrix_path)
+    if n_rows == 0:
+        return np.empty((0, len(FEATURE_COLUMNS)), dtype=FEATURE_DTYPE)
+    return np.memmap(matrix_path, dtype=FEATURE_DTYPE, mode='r',
+                     shape=(n_rows, len(FEATURE_COLUMNS)))
+
+
+def model_id_for(model_path):
+    """Identify a model artifact by its file name and content hash"""
+    with open(model_path, 'rb') as f:
+        digest = hashlib.sha1(f.read()).hexdigest()[:12]
+    return f"{os.path.basename(model_path)}:{digest}"
+
+
+def rescore_audits(model_path, audit_ids=None, conn=None, matrix_path=FEATURE_MATRIX_PATH):
+    """
+    Re-score past audits with a new model artifact in one vectorized pass.
+
+    Args:
+        model_path: Path to a pickled classifier
+        audit_ids: Optional list of audits to rescore (defaults to all)
+
+    Returns:
+        List of dictionaries with the new per-audit results
+    """
+    with open(model_path, 'rb') as f:
+        model = pickle.load(f)
+    model_id = model_id_for(model_path)
+
+    close = conn is None
+    conn = conn or connect()
+    try:
+        query = 'SELECT audit_id, row_id FROM audit_features'
+        params = ()
+        if audit_ids:
+            query += f" WHERE audit_id IN ({','.join('?' * len(audit_ids))})"
+            params = tuple(audit_ids)
+        links = conn.execute(query + ' ORDER BY audit_id', params).fetchall()
+        if not links:
+            print("No stored audits to rescore")
+            return []
+
+        audit_col = np.array([a for a, _ in links])
+        row_col = np.array([r for _, r in links], dtype=np.int64)
+
+        # Predict every referenced vector once
+        with span('load_features'):
+            matrix = load_feature_matrix(matrix_path)
+            unique_rows, inverse = np.unique(row_col, return_inverse=True)
+            features_df = pd.DataFrame(matrix[unique_rows], columns=FEATURE_COLUMNS)
+        with span('inference'):
+            labels = np.asarray(model.predict(features_df), dtype=np.int64)[inverse]
+
+        # Aggregate per audit
+        audits, audit_index = np.unique(audit_col, return_inverse=True)
+        sample_sizes = np.bincount(audit_index)
+        fakes = np.bincount(audit_index, weights=labels).astype(np.int64)
+        authenticity = (sample_sizes - fakes) * 100 / sample_sizes
+
+        rescored_at = time.time()
+        results = [
+            {
+                'audit_id': str(audit_id),
+                'model_id': model_id,
+                'sample_size': int(n),
+                'fake_followers': int(k),
+                'authenticity_percent': float(a),
+            }
+            for audit_id, n, k, a in zip(audits, sample_sizes, fakes, authenticity)
+        ]
+        with conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO rescores (audit_id, model_id, sample_size, fake_followers, '
+                'authenticity_percent, rescored_at) VALUES (?, ?, ?, ?, ?, ?)',
+                [(r['audit_id'], model_id, r['sample_size'], r['fake_followers'],
+                  r['authenticity_percent'], rescored_at) for r in results])
+    finally:
+        if close:
+            conn.close()
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Re-score stored audits with a new model artifact')
+    parser.add_argument('model', help='Path to the pickled classifier')
+    parser.add_argument('--audit', action='append', dest='audit_ids',
+                        help='Audit ID to rescore (repeatable, defaults to all)')
+    parser.add_argument('--profile', action='store_true',
+                        help='Capture a profile of the run under data/profiles')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    with profiled('rescore', enabled=args.profile):
+        results = rescore_audits(args.model, args.audit_ids)
+    elapsed = time.perf_counter() - start
+
+    for r in results:
+        print(f"{r['audit_id']}: {r['authenticity_percent']:.1f}% authentic "
+              f"({r['fake_followers']}/{r['sample_size']} fake)")
+    print(f"\nRescored {len(results)} audits in {elapsed:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
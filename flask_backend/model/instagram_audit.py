@@ -1,31 +1,55 @@
 import pandas as pd
 import numpy as np
 from sklearn.ensemble import RandomForestClassifier
-from playwright.sync_api import sync_playwright
 import time
 import json
-import random
 import os
+import pickle
 import re
+import uuid
+
+import audit_history
+import dataset
+import feature_store
+import snapshot_store
+from batch_scorer import MicroBatchScorer
+from browser_governor import PageGovernor
+from engagement import finish_engagement_collection, start_engagement_collection
+from profiling import span, start_profile
+from verdict_index import get_verdict_index
+from feature_store import FEATURE_COLUMNS
 
 # Path to training data
 MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(MODEL_DIR, 'data')
 TRAIN_DATA_PATH = os.path.join(DATA_DIR, 'train.csv')
+MODEL_ARTIFACT_PATH = os.path.join(DATA_DIR, 'best_model.pkl')
 
 # Initialize the model
 rfc_model = None
 
+# Shared micro-batching scorer, enabled with start_batch_scorer()
+batch_scorer = None
+
 
 def get_model():
     """
-    Get the Random Forest Classifier model, training it if needed.
+    Get the classifier, preferring the artifact exported by train_pipeline.py
+    and falling back to training a Random Forest if there is none.
     """
     global rfc_model
+    if rfc_model is None and os.path.exists(MODEL_ARTIFACT_PATH):
+        try:
+            with open(MODEL_ARTIFACT_PATH, 'rb') as f:
+                rfc_model = pickle.load(f)
+            print(f"Loaded model artifact from {MODEL_ARTIFACT_PATH}")
+        except Exception as e:
+            print(f"Could not load model artifact ({e}), training a new model")
+
     if rfc_model is None:
-        # Load training data
+        # Load training data (memory-mapped from its binary cache)
         try:
-            train = pd.read_csv(TRAIN_DATA_PATH)
+            train_X, train_Y = dataset.load_training_data(TRAIN_DATA_PATH)
         except FileNotFoundError:
             # If training data doesn't exist, create a simple model with default data
             print("Training data not found, using default model")
@@ -46,9 +70,9 @@ def get_model():
             }
             train = pd.DataFrame(data)
 
-        # Split into features and labels
-        train_Y = train.fake
-        train_X = train.drop(columns='fake')
+            # Split into features and labels
+            train_Y = train.fake
+            train_X = train.drop(columns='fake')
 
         # Train the model - Random Forest had the best accuracy in the notebook
         rfc = RandomForestClassifier()
@@ -118,15 +142,37 @@ def predict_fake_followers(followers_info):
     Returns:
         List of 0/1 predictions (0=authentic, 1=fake)
     """
-    # Get the model
-    model = get_model()
-
     # Prepare features for each follower
     features_list = [prepare_follower_features(
         info) for info in followers_info]
 
+    return predict_from_features(features_list)
+
+
+def predict_from_features(features_list):
+    """
+    Predict which followers are fake from already prepared feature dictionaries.
+
+    Args:
+        features_list: List of dictionaries from prepare_follower_features
+
+    Returns:
+        List of 0/1 predictions (0=authentic, 1=fake)
+    """
+    # Share the model call with other in-flight audits when batching is on
+    if batch_scorer is not None and batch_scorer.running:
+        return batch_scorer.predict(features_list)
+
+    return _predict_batch(features_list)
+
+
+def _predict_batch(features_list):
+    """Run the model once over a list of feature dictionaries"""
+    # Get the model
+    model = get_model()
+
     # Convert to DataFrame in the right format
-    features_df = pd.DataFrame(features_list)
+    features_df = pd.DataFrame(features_list, columns=FEATURE_COLUMNS)
 
     # Make predictions
     predictions = model.predict(features_df)
@@ -134,6 +180,38 @@ def predict_fake_followers(followers_info):
     return predictions.tolist()
 
 
+def start_batch_scorer(max_batch_size=None, max_wait_ms=None):
+    """
+    Route predictions from concurrent audits through one micro-batching scorer.
+
+    Args:
+        max_batch_size: Rows per batch that trigger a flush
+        max_wait_ms: Longest time a request waits for a batch to fill
+
+    Returns:
+        The running MicroBatchScorer
+    """
+    global batch_scorer
+    if batch_scorer is None:
+        options = {}
+        if max_batch_size is not None:
+            options['max_batch_size'] = max_batch_size
+        if max_wait_ms is not None:
+            options['max_wait_ms'] = max_wait_ms
+        # Build the model before the first batch so it does not absorb the wait
+        get_model()
+        batch_scorer = MicroBatchScorer(_predict_batch, **options)
+    return batch_scorer.start()
+
+
+def stop_batch_scorer():
+    """Flush pending predictions and go back to scoring each call directly"""
+    global batch_scorer
+    if batch_scorer is not None:
+        batch_scorer.stop()
+        batch_scorer = None
+
+
 def get_instagram_client(username, password):
     """
     Create an Instagram client using Playwright browser automation.
@@ -146,12 +224,16 @@ def get_instagram_client(username, password):
     Returns:
         Playwright browser context with logged-in Instagram session
     """
+    # Imported here so scoring-only processes never load Playwright
+    from playwright.sync_api import sync_playwright
+
     playwright = sync_playwright().start()
     browser = playwright.chromium.launch(headless=False)
-    context = browser.new_context(
-        viewport={"width": 1280, "height": 800},
-        user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-    )
+    context_options = {
+        "viewport": {"width": 1280, "height": 800},
+        "user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+    }
+    context = browser.new_context(**context_options)
     page = context.new_page()
 
     # Navigate to Instagram login page
@@ -178,7 +260,8 @@ def get_instagram_client(username, password):
         playwright.stop()
         raise Exception("Manual login failed or timed out. Please try again.")
 
-    return {"page": page, "context": context, "browser": browser, "playwright": playwright}
+    return {"page": page, "context": context, "browser": browser, "playwright": playwright,
+            "context_options": context_options}
 
 
 def close_instagram_client(client):
@@ -201,8 +284,9 @@ def get_user_data_from_page(page, username):
                 f"  Attempt {attempt+1}/{max_retries} to load profile (timeout: {int(current_timeout/1000)}s)...")
 
             # Navigate to the user's profile with increased timeout
-            page.goto(
-                f"https://www.instagram.com/{username}/", timeout=current_timeout)
+            with span('page.goto'):
+                page.goto(
+                    f"https://www.instagram.com/{username}/", timeout=current_timeout)
 
             # Try different wait strategies
             try:
@@ -212,7 +296,8 @@ def get_user_data_from_page(page, username):
                 print(f"  DOM content load timeout: {e}")
 
             # Wait a bit for JavaScript to execute
-            page.wait_for_timeout(5000)
+            with span('page.wait'):
+                page.wait_for_timeout(5000)
 
             # Use JavaScript to extract data directly from the page
             # This is more reliable than using selectors which can change
@@ -230,21 +315,25 @@ def get_user_data_from_page(page, username):
                 let followingCount = 0;
                 let postsCount = 0;
 
+                // Parse a count such as "1,234", "12.5K" or "1.2M"; the exact
+                // value is in a title attribute when the text is abbreviated
+                const parseCount = (item) => {
+                    const titled = item.querySelector('[title]');
+                    const text = (titled && /\\d/.test(titled.title)) ? titled.title : item.innerText;
+                    const match = text.replace(/,/g, '').match(/(\\d+(?:\\.\\d+)?)([KkMm])?\\b/);
+                    if (!match) {
+                        return 0;
+                    }
+                    const multiplier = { k: 1e3, m: 1e6 }[(match[2] || '').toLowerCase()] || 1;
+                    return Math.round(parseFloat(match[1]) * multiplier);
+                };
+
                 // Try to get counts from meta section
                 const metaItems = document.querySelectorAll('header section ul li');
                 if (metaItems.length >= 3) {
-                    // Extract numbers using regex
-                    const postsText = metaItems[0].innerText;
-                    const postsMatch = postsText.match(/(\\d+(?:,\\d+)*)/);
-                    postsCount = postsMatch ? parseInt(postsMatch[0].replace(/,/g, '')) : 0;
-
-                    const followersText = metaItems[1].innerText;
-                    const followersMatch = followersText.match(/(\\d+(?:,\\d+)*)/);
-                    followerCount = followersMatch ? parseInt(followersMatch[0].replace(/,/g, '')) : 0;
-
-                    const followingText = metaItems[2].innerText;
-                    const followingMatch = followingText.match(/(\\d+(?:,\\d+)*)/);
-                    followingCount = followingMatch ? parseInt(followingMatch[0].replace(/,/g, '')) : 0;
+                    postsCount = parseCount(metaItems[0]);
+                    followerCount = parseCount(metaItems[1]);
+                    followingCount = parseCount(metaItems[2]);
                 }
 
                 // Get profile pic
@@ -330,7 +419,8 @@ def get_user_data_from_page(page, username):
             if attempt < max_retries - 1:
                 wait_time = 5 * (attempt + 1)  # Progressive backoff
                 print(f"  Waiting {wait_time} seconds before retrying...")
-                time.sleep(wait_time)
+                with span('retry_backoff'):
+                    time.sleep(wait_time)
 
     # If all retries fail, return a minimal user info object with default values
     print(
@@ -453,7 +543,8 @@ def get_followers_data(client, username, max_followers=50):
         return []
 
 
-def run_audit(username, password, target_username=None):
+def run_audit(username, password, target_username=None, incremental=False,
+              score_ttl=snapshot_store.SCORE_TTL_SECONDS, profile=False):
     """
     Run a complete Instagram audit using the model from the notebook.
 
@@ -461,16 +552,27 @@ def run_audit(username, password, target_username=None):
         username: Instagram username for reference (manual login will be required)
         password: Instagram password for reference (manual login will be required)
         target_username: Username to audit (if different from login)
+        incremental: Diff against the last follower snapshot and only fetch
+            new followers or followers whose stored score has expired
+        score_ttl: Maximum age in seconds of a stored score reused by an
+            incremental audit
+        profile: Capture a cProfile profile and wall-clock spans for this
+            audit, stored under the audit ID
 
     Returns:
         Dictionary with audit results
     """
-    result = {}
     client = None
+    snapshot_conn = None
+    audit_id = uuid.uuid4().hex
+    result = {'audit_id': audit_id}
+    audit_profile = start_profile(
+        f"audit {target_username}", audit_id) if profile else None
 
     try:
         # Login to Instagram using Playwright (manual login)
-        client = get_instagram_client(username, password)
+        with span('login'):
+            client = get_instagram_client(username, password)
 
         if target_username is None:
             # Since we don't know who logged in, ask for the target username
@@ -483,27 +585,35 @@ def run_audit(username, password, target_username=None):
 
         # Get user info - this is the most important part
         print(f"\nGetting profile data for {target_username}...")
-        user_info = get_user_data_from_page(client["page"], target_username)
+        with span('target_profile'):
+            user_info = get_user_data_from_page(client["page"], target_username)
 
         # Check if user exists
         if not user_info.get('exists', True):
-            return {
-                'status': 'error',
-                'error': f"User {target_username} doesn't exist"
-            }
+            # Fill in result so the finally block can attach the profile
+            result['status'] = 'error'
+            result['error'] = f"User {target_username} doesn't exist"
+            return result
+
+        # Collect engagement in a separate session while followers are sampled
+        print(f"\nStarting engagement analysis for {target_username}...")
+        engagement_executor, engagement_future = start_engagement_collection(
+            client, target_username, user_info.get('follower_count', 0))
 
         # Try to get followers, but don't fail the whole audit if we can't
         print(f"\nGetting followers data for {target_username}...")
-        followers = get_followers_data(client, target_username)
+        with span('follower_collection'):
+            followers = get_followers_data(client, target_username)
 
         # If we can't get followers or there aren't any, do a limited audit
         if not followers or len(followers) == 0:
             print(
                 f"No followers found or account is private. Limited audit will be performed.")
 
-            # Calculate engagement metrics if possible
-            engagement_rate = 0
-            posts_analyzed = 0
+            # Engagement metrics are still available for public accounts
+            with span('engagement_wait'):
+                engagement = finish_engagement_collection(
+                    engagement_executor, engagement_future)
 
             # Create a basic result with just the user info
             result['username'] = target_username
@@ -521,44 +631,93 @@ def run_audit(username, password, target_username=None):
                     'fake_followers': 0,
                     'authenticity_percent': 0,
                 },
-                'engagement_analysis': {
-                    'engagement_rate': engagement_rate,
-                    'posts_analyzed': posts_analyzed,
-                }
+                'engagement_analysis': engagement
             }
             result['status'] = 'partial'
             result['message'] = "Limited audit performed: only basic profile information available"
             return result
 
-        # If we have followers, try to analyze them
-        sample_size = min(50, len(followers))
-        print(f"\nAnalyzing {sample_size} followers...")
+        # The followers dialog only yields what was scrolled into view
+        follower_count = user_info.get('follower_count') or 0
+        followers_complete = bool(follower_count) and len(followers) >= follower_count
+
+        # Load the previous follower snapshot for incremental audits
+        snapshot_conn = snapshot_store.connect()
+        previous = None
+        if incremental:
+            previous = snapshot_store.get_latest_snapshot(
+                snapshot_conn, target_username)
+            if previous is None:
+                print("No previous snapshot found, running a full audit...")
+
+        # Sample followers, reusing fresh scores from the previous snapshot
+        reused, random_followers = snapshot_store.plan_sample(
+            followers, previous, 50, score_ttl)
+        stored_scores = {f: previous['scores'][f] for f in reused}
+
+        # Skip accounts already classified in other creators' audits
+        known, random_followers = get_verdict_index().known_verdicts(random_followers)
+        reused.update((f, verdict) for f, (verdict, _) in known.items())
+        stored_scores.update(known)
+
+        fetch_count = len(random_followers)
+        sample_size = len(reused) + fetch_count
+        print(
+            f"\nAnalyzing {sample_size} followers ({len(reused)} reused, {len(known)} known, {fetch_count} to fetch)...")
 
-        # Sample followers and get their info
-        random_followers = random.sample(followers, sample_size)
+        # Get info for the followers that need scoring, recycling the page
+        # periodically to keep browser memory flat
+        governor = PageGovernor(client)
         f_infos = []
 
         for i, f in enumerate(random_followers):
-            print(f"Processing follower {i+1}/{sample_size}: {f}")
-            f_info = get_user_data_from_page(client["page"], f)
+            print(f"Processing follower {i+1}/{fetch_count}: {f}")
+            with span('follower_profile'):
+                f_info = get_user_data_from_page(governor.page, f)
             f_infos.append(f_info)
+            with span('browser_governor'):
+                governor.after_navigation()
 
             # Add a small delay between requests to avoid rate limiting
-            if i < sample_size - 1:  # Don't delay after the last one
-                time.sleep(1)
+            if i < fetch_count - 1:  # Don't delay after the last one
+                with span('rate_limit_delay'):
+                    time.sleep(1)
 
         # Use ML model to predict fake followers
         print("\nPredicting fake followers...")
-        fake_labels = predict_fake_followers(f_infos)
-        no_fakes = sum(fake_labels)
+        with span('feature_building'):
+            features_list = [prepare_follower_features(info) for info in f_infos]
+        with span('inference'):
+            fake_labels = predict_from_features(
+                features_list) if features_list else []
+        scored_at = time.time()
+        scores = dict(reused)
+        scores.update(zip(random_followers, fake_labels))
+        no_fakes = sum(scores.values())
         authenticity = ((sample_size - no_fakes) * 100) / \
             sample_size if sample_size > 0 else 0
 
         # Track fake follower usernames
-        fake_follower_usernames = []
-        for i, is_fake in enumerate(fake_labels):
-            if is_fake == 1:
-                fake_follower_usernames.append(random_followers[i])
+        fake_follower_usernames = [
+            f for f, is_fake in scores.items() if is_fake == 1]
+
+        # Store the follower list as a new snapshot for future re-audits
+        stored_scores.update(
+            (f, (is_fake, scored_at)) for f, is_fake in zip(random_followers, fake_labels))
+        with span('storage'):
+            snapshot_version = snapshot_store.save_snapshot(
+                snapshot_conn, target_username, audit_id, followers, stored_scores,
+                complete=followers_complete)
+
+            # Keep the feature vectors so past audits can be re-scored later
+            feature_store.store_audit_features(
+                audit_id, target_username, random_followers, features_list,
+                reused_usernames=list(reused))
+
+        # Collect the engagement metrics gathered in the background
+        with span('engagement_wait'):
+            engagement = finish_engagement_collection(
+                engagement_executor, engagement_future)
 
         # Prepare result
         print("\nPreparing audit results...")
@@ -577,14 +736,34 @@ def run_audit(username, password, target_username=None):
                 'fake_followers': no_fakes,
                 'authenticity_percent': authenticity,
                 'fake_follower_usernames': fake_follower_usernames,
+                'reused_scores': len(reused),
+                'known_verdicts': len(known),
+                'fetched_followers': fetch_count,
+                'snapshot_version': snapshot_version,
             },
-            'engagement_analysis': {
-                'engagement_rate': 0,  # Simplified version doesn't calculate engagement
-                'posts_analyzed': 0,
-            }
+            'engagement_analysis': engagement
         }
 
+        result['browser_session'] = governor.report()
+        print(f"Browser session: {result['browser_session']}")
+
+        if previous is not None:
+            result['audit']['churn'] = snapshot_store.calculate_churn(
+                previous, followers, scores, complete=followers_complete)
+
         result['status'] = 'success'
+
+        # Keep the result and per-follower verdicts for trend queries
+        follower_rows = [(f, is_fake, None, None) for f, is_fake in reused.items()]
+        follower_rows += [
+            (f, is_fake, info.get('follower_count'), info.get('following_count'))
+            for f, is_fake, info in zip(random_followers, fake_labels, f_infos)]
+        try:
+            audit_history.record_audit(result, follower_rows)
+        except Exception as e:
+            # The audit itself succeeded; only trend queries miss it
+            print(f"\nCould not record audit history: {e}")
+
         print("\n===== Audit completed successfully =====")
 
     except Exception as e:
@@ -592,9 +771,19 @@ def run_audit(username, password, target_username=None):
         result['status'] = 'error'
         result['error'] = str(e)
     finally:
+        if snapshot_conn is not None:
+            snapshot_conn.close()
         # Close the browser
         if client:
             print("\nClosing browser...")
             close_instagram_client(client)
+        if audit_profile is not None:
+            profile_info = audit_profile.stop()
+            result['profile'] = {
+                'profile_id': profile_info['profile_id'],
+                'wall_seconds': profile_info['wall_seconds'],
+                'formats': sorted(profile_info['paths']),
+            }
+            print(f"\nProfile saved as {profile_info['profile_id']}")
 
     return result
@@ -0,0 +1,158 @@
+import cProfile
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+
+# Where captured profiles are written
+MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(MODEL_DIR, 'data')
+PROFILE_DIR = os.path.join(DATA_DIR, 'profiles')
+
+PROFILE_FORMATS = {
+    'pstats': '.pstats',
+    'speedscope': '.speedscope.json',
+}
+PROFILE_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+_local = threading.local()
+_NULL_SPAN = nullcontext()
+
+
+class AuditProfile:
+    """
+    cProfile capture plus wall-clock spans for one audit on the current thread.
+
+    Spans are recorded as open/close events so they can be exported as a
+    speedscope evented profile next to the cProfile pstats dump.
+    """
+
+    def __init__(self, name, profile_id=None, profile_dir=PROFILE_DIR):
+        self.name = name
+        self.profile_id = profile_id or uuid.uuid4().hex
+        self.profile_dir = profile_dir
+        self.profiler = cProfile.Profile()
+        self.frames = {}
+        self.events = []
+        self.started = None
+        self.ended = None
+
+    def start(self):
+        self.started = time.perf_counter()
+        _local.profile = self
+        try:
+            self.profiler.enable()
+        except ValueError:
+            # Only one cProfile can be active per interpreter on Python 3.12+;
+            # concurrent captures fall back to spans only
+            print("Another profiler is active, capturing spans only")
+            self.profiler = None
+        return self
+
+    def stop(self):
+        """Stop capturing and write the artifacts"""
+        if self.profiler is not None:
+            self.profiler.disable()
+        self.ended = time.perf_counter()
+        _local.profile = None
+        return self.save()
+
+    def _event(self, kind, name):
+        frame = self.frames.setdefault(name, len(self.frames))
+        self.events.append({'type': kind, 'frame': frame,
+                            'at': (time.perf_counter() - self.started) * 1000})
+
+    @contextmanager
+    def span(self, name):
+        self._event('O', name)
+        try:
+            yield
+        finally:
+            self._event('C', name)
+
+    def to_speedscope(self):
+        """The recorded spans in speedscope's evented file format"""
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'name': self.name,
+            'exporter': 'igaudit',
+            'shared': {'frames': [{'name': name} for name in self.frames]},
+            'profiles': [{
+                'type': 'evented',
+                'name': self.name,
+                'unit': 'milliseconds',
+                'startValue': 0,
+                'endValue': (self.ended - self.started) * 1000,
+                'events': self.events,
+            }],
+        }
+
+    def save(self):
+        """
+        Write the pstats and speedscope files.
+
+        Returns:
+            Dictionary with the profile ID and the artifact paths
+        """
+        os.makedirs(self.profile_dir, exist_ok=True)
+        paths = {fmt: profile_path(self.profile_id, fmt, self.profile_dir)
+                 for fmt in PROFILE_FORMATS}
+        if self.profiler is not None:
+            self.profiler.dump_stats(paths['pstats'])
+        else:
+            del paths['pstats']
+        with open(paths['speedscope'], 'w') as f:
+            json.dump(self.to_speedscope(), f)
+        return {'profile_id': self.profile_id,
+                'wall_seconds': self.ended - self.started,
+                'paths': paths}
+
+
+def span(name):
+    """
+    Time a block as a named span of the profile active on this thread.
+
+    Returns a shared no-op context manager when no profile is active, so
+    instrumented code costs one attribute lookup when profiling is off.
+    """
+    profile = getattr(_local, 'profile', None)
+    if profile is None:
+        return _NULL_SPAN
+    return profile.span(name)
+
+
+def start_profile(name, profile_id=None):
+    """Start capturing a profile on the current thread"""
+    return AuditProfile(name, profile_id).start()
+
+
+@contextmanager
+def profiled(name, enabled=True):
+    """
+    Profile the enclosed block when enabled.
+
+    Yields:
+        The active AuditProfile, or None when disabled
+    """
+    if not enabled:
+        yield None
+        return
+    profile = start_profile(name)
+    try:
+        with profile.span(name):
+            yield profile
+    finally:
+        info = profile.stop()
+        print(f"Profile {info['profile_id']} written to {profile.profile_dir}")
+
+
+def profile_path(profile_id, fmt, profile_dir=PROFILE_DIR):
+    """
+    Path of a stored profile artifact, or None if the ID or format is invalid.
+    """
+    if fmt not in PROFILE_FORMATS or not PROFILE_ID_PATTERN.match(profile_id or ''):
+        return None
+    return os.path.join(profile_dir, profile_id + PROFILE_FORMATS[fmt])
@@ -0,0 +1,507 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import namedtuple
+from concurrent.futures import Future
+
+try:
+    import psutil
+except ImportError:  # Optional: fall back to signal 0 on POSIX
+    psutil = None
+
+# Priority classes, dispatched in this order
+INTERACTIVE = 'interactive'
+BATCH = 'batch'
+PRIORITY_CLASSES = (INTERACTIVE, BATCH)
+
+# Concurrent audits (browser sessions) across all worker processes
+AUDIT_SLOTS = 4
+# Slots batch audits may never take, so interactive audits rarely wait
+INTERACTIVE_RESERVED_SLOTS = 1
+# Requests expected to wait longer than this are rejected at admission
+MAX_EXPECTED_WAIT_SECONDS = {INTERACTIVE: 15 * 60, BATCH: 24 * 60 * 60}
+# Initial estimate of an audit's duration, refined as audits complete
+INITIAL_AUDIT_SECONDS = 180
+DURATION_SMOOTHING = 0.2
+# Finished jobs kept for status queries
+MAX_FINISHED_JOBS = 1000
+# How often idle slots look for jobs submitted by other processes
+POLL_INTERVAL_SECONDS = 1.0
+
+# Job and queue state shared by the worker processes
+MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(MODEL_DIR, 'data')
+SCHEDULER_DB_PATH = os.path.join(DATA_DIR, 'scheduler.db')
+
+# max_concurrent=None means only the slots limit the tenant
+TenantQuota = namedtuple('TenantQuota', ['weight', 'max_concurrent', 'max_queued'])
+DEFAULT_QUOTA = TenantQuota(weight=1.0, max_concurrent=1, max_queued=20)
+# Callers without an API key (including the web UI) share this tenant, so
+# its limits also bound what a keyed tenant gets by leaving its key off
+DEFAULT_TENANT = 'default'
+DEFAULT_TENANT_QUOTA = TenantQuota(weight=1.0, max_concurrent=2, max_queued=20)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    tenant TEXT NOT NULL,
+    priority TEXT NOT NULL,
+    status TEXT NOT NULL,
+    finish_tag REAL NOT NULL,
+    owner_pid INTEGER NOT NULL,
+    owner_token TEXT NOT NULL,
+    submitted_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    expected_wait REAL,
+    error TEXT,
+    result_json TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_queue ON jobs (status, priority, finish_tag);
+CREATE INDEX IF NOT EXISTS idx_jobs_finished ON jobs (finished_at);
+CREATE TABLE IF NOT EXISTS scheduler_state (
+    key TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+'''
+
+JOB_COLUMNS = ['job_id', 'tenant', 'priority', 'status', 'finish_tag', 'owner_pid',
+               'owner_token', 'submitted_at', 'started_at', 'finished_at',
+               'expected_wait', 'error', 'result_json']
+
+
+class AdmissionError(Exception):
+    """Raised when a request is rejected at admission"""
+
+    def __init__(self, message, expected_wait=None):
+        super().__init__(message)
+        self.expected_wait = expected_wait
+
+
+class Job:
+    """One audit request and its lifecycle, as stored in the jobs table"""
+
+    def __init__(self, row, future=None):
+        for column, value in zip(JOB_COLUMNS, row):
+            setattr(self, column, value)
+        # Only set in the process that accepted the job
+        self.future = future
+
+    @property
+    def result(self):
+        """The audit result of a finished job, or None"""
+        return json.loads(self.result_json) if self.result_json else None
+
+    def describe(self):
+        info = {
+            'job_id': self.job_id,
+            'tenant': self.tenant,
+            'priority': self.priority,
+            'status': self.status,
+            'submitted_at': self.submitted_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'expected_wait_seconds': self.expected_wait,
+        }
+        if self.status == 'failed':
+            info['error'] = self.error
+        return info
+
+
+def quota_for(tenant):
+    """Built-in quota of a tenant before configured overrides"""
+    return DEFAULT_TENANT_QUOTA if tenant == DEFAULT_TENANT else DEFAULT_QUOTA
+
+
+def connect(path=SCHEDULER_DB_PATH, create=False):
+    """
+    Open the scheduler database, creating the schema if create is set.
+
+    Transactions are explicit (BEGIN IMMEDIATE), so admission and dispatch
+    decisions of different processes are serialized.
+    """
+    if create:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    if create:
+        for attempt in range(5):
+            try:
+                # WAL lets status queries read while a slot claims a job. The
+                # mode is persistent; switching it does not wait on other
+                # processes creating the database at the same time, so retry
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.executescript(SCHEMA)
+                break
+            except sqlite3.OperationalError:
+                if attempt == 4:
+                    raise
+                time.sleep(0.1 * (attempt + 1))
+    return conn
+
+
+def _pid_alive(pid):
+    """
+    Whether a process with this PID exists.
+
+    Without psutil, Windows processes are assumed alive: os.kill there
+    terminates the process instead of probing it.
+    """
+    if psutil is not None:
+        return psutil.pid_exists(pid)
+    if os.name == 'nt':
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class FairShareScheduler:
+    """
+    Weighted fair queuing of audits across tenants with priority classes.
+
+    Every tenant has a weight and limits on running and queued audits. Within
+    a priority class, jobs are ordered by their virtual finish time, so a
+    tenant submitting a large batch only gets its weighted share of the
+    slots. Interactive jobs are always dispatched before batch jobs, and
+    batch jobs are kept out of the reserved slots so they only use idle
+    capacity.
+
+    Jobs, slot usage and the fair-queuing tags live in SQLite, so every
+    worker process of a server shares one set of slots and quotas and any
+    worker can report a job's status. The audit arguments (credentials) are
+    never stored: each job runs in the process that accepted it, which only
+    claims it once it is the next job to dispatch. The database must be
+    local to the host, since jobs of exited processes are detected by PID.
+    """
+
+    def __init__(self, run_fn, slots=AUDIT_SLOTS, reserved_slots=INTERACTIVE_RESERVED_SLOTS,
+                 tenant_quotas=None, default_quota=DEFAULT_QUOTA,
+                 max_expected_wait=MAX_EXPECTED_WAIT_SECONDS, db_path=SCHEDULER_DB_PATH):
+        self.run_fn = run_fn
+        self.slots = slots
+        self.reserved_slots = min(reserved_slots, slots - 1)
+        self.tenant_quotas = {DEFAULT_TENANT: DEFAULT_TENANT_QUOTA}
+        self.tenant_quotas.update(tenant_quotas or {})
+        self.default_quota = default_quota
+        self.max_expected_wait = max_expected_wait
+        self.db_path = db_path
+        self.pid = os.getpid()
+        self.token = uuid.uuid4().hex
+
+        self._lock = threading.Condition()
+        # Arguments and futures of the jobs accepted by this process
+        self._local = {}
+        self._wakeups = 0
+        self._stopping = threading.Event()
+        connect(db_path, create=True).close()
+        self._workers = [
+            threading.Thread(target=self._work, name=f'audit-slot-{i}', daemon=True)
+            for i in range(slots)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def quota(self, tenant):
+        return self.tenant_quotas.get(tenant, self.default_quota)
+
+    def submit(self, tenant, priority=INTERACTIVE, **kwargs):
+        """
+        Admit an audit request.
+
+        Args:
+            tenant: Identifier of the caller the quota applies to
+            priority: INTERACTIVE or BATCH
+            kwargs: Arguments for the audit function
+
+        Returns:
+            The queued Job, with its expected wait in seconds
+
+        Raises:
+            AdmissionError: If the tenant's queue is full or the expected
+                wait exceeds the limit for the priority class
+        """
+        if priority not in PRIORITY_CLASSES:
+            raise ValueError(f"Unknown priority: {priority}")
+        quota = self.quota(tenant)
+        job_id = uuid.uuid4().hex
+        future = Future()
+
+        # Register the arguments before the job becomes visible to this
+        # process's slots; the condition is never held during database work
+        with self._lock:
+            self._local[job_id] = (kwargs, future)
+        conn = connect(self.db_path)
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                queued = conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE tenant = ? AND status = 'queued'",
+                    (tenant,)).fetchone()[0]
+                if queued >= quota.max_queued:
+                    raise AdmissionError(
+                        f"Tenant {tenant} already has {quota.max_queued} audits queued")
+
+                # Virtual finish time: one audit of work scaled by the tenant's weight
+                last_finish_key = f'last_finish:{priority}:{tenant}'
+                start_tag = max(self._state(conn, f'virtual_time:{priority}', 0.0),
+                                self._state(conn, last_finish_key, 0.0))
+                finish_tag = start_tag + 1.0 / quota.weight
+
+                expected_wait = self._expected_wait(conn, priority, finish_tag)
+                if expected_wait > self.max_expected_wait[priority]:
+                    raise AdmissionError(
+                        f"Expected wait of {expected_wait:.0f}s exceeds the {priority} limit",
+                        expected_wait)
+
+                self._set_state(conn, last_finish_key, finish_tag)
+                row = (job_id, tenant, priority, 'queued', finish_tag, self.pid, self.token,
+                       time.time(), None, None, expected_wait, None, None)
+                conn.execute(
+                    f"INSERT INTO jobs ({', '.join(JOB_COLUMNS)}) "
+                    f"VALUES ({', '.join('?' * len(JOB_COLUMNS))})", row)
+                conn.execute('COMMIT')
+            except BaseException:
+                if conn.in_transaction:
+                    conn.execute('ROLLBACK')
+                raise
+        except BaseException:
+            with self._lock:
+                del self._local[job_id]
+            raise
+        finally:
+            conn.close()
+
+        self._wake()
+        return Job(row, future)
+
+    def get_job(self, job_id):
+        """The job with this ID, submitted by any worker process, or None"""
+        conn = connect(self.db_path)
+        try:
+            row = conn.execute(
+                f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE job_id = ?",
+                (job_id,)).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        with self._lock:
+            local = self._local.get(job_id)
+        return Job(row, local[1] if local else None)
+
+    def stats(self):
+        """Queue depths, running audits and the current duration estimate"""
+        conn = connect(self.db_path)
+        try:
+            running_by_tenant = dict(conn.execute(
+                "SELECT tenant, COUNT(*) FROM jobs WHERE status = 'running' GROUP BY tenant"))
+            queued_by_tenant = dict(conn.execute(
+                "SELECT tenant, COUNT(*) FROM jobs WHERE status = 'queued' GROUP BY tenant"))
+            queued = dict(conn.execute(
+                "SELECT priority, COUNT(*) FROM jobs WHERE status = 'queued' GROUP BY priority"))
+            avg_duration = self._state(conn, 'avg_duration', INITIAL_AUDIT_SECONDS)
+        finally:
+            conn.close()
+        return {
+            'slots': self.slots,
+            'reserved_interactive_slots': self.reserved_slots,
+            'running': sum(running_by_tenant.values()),
+            'queued': {p: queued.get(p, 0) for p in PRIORITY_CLASSES},
+            'running_by_tenant': running_by_tenant,
+            'queued_by_tenant': queued_by_tenant,
+            'avg_audit_seconds': avg_duration,
+        }
+
+    @staticmethod
+    def _state(conn, key, default):
+        row = conn.execute('SELECT value FROM scheduler_state WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else default
+
+    @staticmethod
+    def _set_state(conn, key, value):
+        conn.execute('INSERT OR REPLACE INTO scheduler_state (key, value) VALUES (?, ?)',
+                     (key, value))
+
+    def _expected_wait(self, conn, priority, finish_tag):
+        """
+        Estimate how long a new job waits: jobs dispatched before it, spread
+        over the slots it may use, times the average audit duration.
+        """
+        ahead = conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND priority = ? "
+            "AND finish_tag <= ?", (priority, finish_tag)).fetchone()[0]
+        usable_slots = self.slots
+        if priority == BATCH:
+            ahead += conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND priority = ?",
+                (INTERACTIVE,)).fetchone()[0]
+            usable_slots = self.slots - self.reserved_slots
+        running = conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE status = 'running'").fetchone()[0]
+        avg_duration = self._state(conn, 'avg_duration', INITIAL_AUDIT_SECONDS)
+        busy = max(0, running + ahead - usable_slots + 1)
+        return busy / usable_slots * avg_duration
+
+    def _reap(self, conn):
+        """Fail queued and running jobs of worker processes that exited"""
+        owners = conn.execute(
+            "SELECT DISTINCT owner_pid, owner_token FROM jobs "
+            "WHERE status IN ('queued', 'running') AND owner_token != ?",
+            (self.token,)).fetchall()
+        for pid, token in owners:
+            # Our own PID with another token is a previous run of this process
+            if pid == self.pid or not _pid_alive(pid):
+                conn.execute(
+                    "UPDATE jobs SET status = 'failed', finished_at = ?, "
+                    "error = 'Worker process exited' "
+                    "WHERE owner_token = ? AND status IN ('queued', 'running')",
+                    (time.time(), token))
+
+    def _claim(self):
+        """
+        Mark the next dispatchable job as running if this process owns it.
+
+        Returns:
+            The claimed Job, or None if no job can start or the next one
+            belongs to another process (whose idle slots will claim it)
+        """
+        try:
+            conn = connect(self.db_path)
+        except sqlite3.Error as e:
+            print(f"Could not claim an audit job: {e}")
+            return None
+        try:
+            if conn.execute("SELECT 1 FROM jobs WHERE status = 'queued' LIMIT 1").fetchone() is None:
+                return None
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                self._reap(conn)
+                running_by_tenant = dict(conn.execute(
+                    "SELECT tenant, COUNT(*) FROM jobs WHERE status = 'running' GROUP BY tenant"))
+                running = sum(running_by_tenant.values())
+                row = None
+                for priority in PRIORITY_CLASSES:
+                    limit = self.slots if priority == INTERACTIVE else self.slots - self.reserved_slots
+                    if running >= limit:
+                        break
+                    for candidate in conn.execute(
+                            f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs "
+                            "WHERE status = 'queued' AND priority = ? ORDER BY finish_tag, rowid",
+                            (priority,)).fetchall():
+                        tenant = candidate[JOB_COLUMNS.index('tenant')]
+                        max_concurrent = self.quota(tenant).max_concurrent
+                        if max_concurrent is None or running_by_tenant.get(tenant, 0) < max_concurrent:
+                            row = candidate
+                            break
+                    if row is not None:
+                        break
+
+                if row is None or row[JOB_COLUMNS.index('owner_token')] != self.token:
+                    conn.execute('COMMIT')
+                    return None
+
+                job = Job(row)
+                job.status = 'running'
+                job.started_at = time.time()
+                conn.execute("UPDATE jobs SET status = 'running', started_at = ? WHERE job_id = ?",
+                             (job.started_at, job.job_id))
+                self._set_state(conn, f'virtual_time:{job.priority}', job.finish_tag)
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+        except sqlite3.Error as e:
+            # e.g. the database stayed locked; try again on the next poll
+            print(f"Could not claim an audit job: {e}")
+            return None
+        finally:
+            conn.close()
+        return job
+
+    def _finish(self, job, result=None, error=None):
+        """Store the outcome of a job, update the duration estimate and prune old jobs"""
+        finished_at = time.time()
+        conn = connect(self.db_path)
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, finished_at = ?, error = ?, result_json = ? "
+                    "WHERE job_id = ?",
+                    ('failed' if error is not None else 'done', finished_at, error,
+                     json.dumps(result) if error is None else None, job.job_id))
+                avg_duration = self._state(conn, 'avg_duration', INITIAL_AUDIT_SECONDS)
+                duration = finished_at - job.started_at
+                self._set_state(conn, 'avg_duration',
+                                avg_duration + DURATION_SMOOTHING * (duration - avg_duration))
+                conn.execute(
+                    "DELETE FROM jobs WHERE finished_at IS NOT NULL AND job_id NOT IN "
+                    "(SELECT job_id FROM jobs WHERE finished_at IS NOT NULL "
+                    "ORDER BY finished_at DESC LIMIT ?)", (MAX_FINISHED_JOBS,))
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+        finally:
+            conn.close()
+
+    def _wake(self):
+        """Let this process's idle slots look for a job right away"""
+        with self._lock:
+            self._wakeups += 1
+            self._lock.notify_all()
+
+    def stop(self, timeout=None):
+        """Stop the slots once their running audits finish; queued jobs stay queued"""
+        self._stopping.set()
+        self._wake()
+        for worker in self._workers:
+            worker.join(timeout)
+
+    def _work(self):
+        while not self._stopping.is_set():
+            # The condition only guards the wake-up counter and the local
+            # arguments; claiming takes the database lock without holding it
+            with self._lock:
+                seen = self._wakeups
+            job = self._claim()
+            if job is None:
+                with self._lock:
+                    if self._wakeups == seen:
+                        self._lock.wait(POLL_INTERVAL_SECONDS)
+                continue
+            with self._lock:
+                kwargs, future = self._local.pop(job.job_id, (None, None))
+
+            if future is None:
+                self._finish(job, error='Job arguments were lost')
+                continue
+
+            error = None
+            try:
+                result = self.run_fn(**kwargs)
+            except Exception as e:
+                result, error = None, e
+            # The arguments include credentials; drop them once the audit ran
+            kwargs = None
+
+            try:
+                self._finish(job, result, str(error) if error is not None else None)
+            except Exception as e:
+                # e.g. a result that cannot be stored; free the slot regardless
+                print(f"Could not store result of job {job.job_id}: {e}")
+                self._finish(job, error=f"Could not store result: {e}")
+            finally:
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+
+            self._wake()
@@ -0,0 +1,228 @@
+import math
+import os
+import random
+import sqlite3
+import time
+
+# Path to the snapshot database
+MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(MODEL_DIR, 'data')
+SNAPSHOT_DB_PATH = os.path.join(DATA_DIR, 'snapshots.db')
+
+# Prior scores older than this are re-fetched instead of reused (30 days)
+SCORE_TTL_SECONDS = 30 * 24 * 60 * 60
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS snapshots (
+    snapshot_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    target TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    audit_id TEXT,
+    created_at REAL NOT NULL,
+    complete INTEGER NOT NULL DEFAULT 0,
+    UNIQUE (target, version)
+);
+CREATE TABLE IF NOT EXISTS snapshot_followers (
+    snapshot_id INTEGER NOT NULL REFERENCES snapshots(snapshot_id),
+    username TEXT NOT NULL,
+    is_fake INTEGER,
+    scored_at REAL,
+    PRIMARY KEY (snapshot_id, username)
+);
+'''
+
+
+def connect(path=SNAPSHOT_DB_PATH):
+    """
+    Open the snapshot database, creating the schema if needed.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    columns = [row[1] for row in conn.execute('PRAGMA table_info(snapshots)')]
+    if 'complete' not in columns:
+        # Snapshots stored before completeness was tracked are partial windows
+        conn.execute('ALTER TABLE snapshots ADD COLUMN complete INTEGER NOT NULL DEFAULT 0')
+        conn.commit()
+    return conn
+
+
+def get_latest_snapshot(conn, target):
+    """
+    Load the most recent follower snapshot for a target.
+
+    Args:
+        conn: Open snapshot database connection
+        target: Audited username
+
+    Returns:
+        Dictionary with the snapshot version, follower list, whether the
+        list is the complete follower list, and the scores of the followers
+        audited in it, or None if there is no snapshot yet
+    """
+    row = conn.execute(
+        'SELECT snapshot_id, version, audit_id, created_at, complete FROM snapshots '
+        'WHERE target = ? ORDER BY version DESC LIMIT 1', (target,)).fetchone()
+    if row is None:
+        return None
+
+    snapshot_id, version, audit_id, created_at, complete = row
+    followers = []
+    scores = {}
+    for username, is_fake, scored_at in conn.execute(
+            'SELECT username, is_fake, scored_at FROM snapshot_followers '
+            'WHERE snapshot_id = ?', (snapshot_id,)):
+        followers.append(username)
+        if is_fake is not None:
+            scores[username] = (is_fake, scored_at)
+
+    return {
+        'version': version,
+        'audit_id': audit_id,
+        'created_at': created_at,
+        'complete': bool(complete),
+        'followers': followers,
+        'scores': scores,
+    }
+
+
+def save_snapshot(conn, target, audit_id, followers, scores, complete=False):
+    """
+    Store a new version of a target's follower list.
+
+    Args:
+        conn: Open snapshot database connection
+        target: Audited username
+        audit_id: Identifier of the audit that produced the snapshot
+        followers: List of follower usernames seen in this audit
+        scores: Dictionary of username -> (is_fake, scored_at) for audited followers
+        complete: Whether followers is the target's whole follower list
+            rather than the window scrolled into view
+
+    Returns:
+        The new snapshot version number
+    """
+    with conn:
+        # Take the write lock before reading the version, so concurrent
+        # audits of the same target get consecutive versions
+        conn.execute('BEGIN IMMEDIATE')
+        row = conn.execute(
+            'SELECT MAX(version) FROM snapshots WHERE target = ?', (target,)).fetchone()
+        version = (row[0] or 0) + 1
+        cursor = conn.execute(
+            'INSERT INTO snapshots (target, version, audit_id, created_at, complete) '
+            'VALUES (?, ?, ?, ?, ?)',
+            (target, version, audit_id, time.time(), int(complete)))
+        snapshot_id = cursor.lastrowid
+        rows = []
+        for username in dict.fromkeys(followers):
+            is_fake, scored_at = scores.get(username, (None, None))
+            rows.append((snapshot_id, username, is_fake, scored_at))
+        conn.executemany(
+            'INSERT INTO snapshot_followers (snapshot_id, username, is_fake, scored_at) '
+            'VALUES (?, ?, ?, ?)', rows)
+    return version
+
+
+def diff_followers(previous_followers, current_followers):
+    """
+    Compare two follower lists.
+
+    Returns:
+        Tuple of (added, removed, unchanged) username lists
+    """
+    previous_set = set(previous_followers)
+    current_set = set(current_followers)
+    added = [f for f in current_followers if f not in previous_set]
+    removed = [f for f in previous_followers if f not in current_set]
+    unchanged = [f for f in current_followers if f in previous_set]
+    return added, removed, unchanged
+
+
+def plan_sample(followers, previous, sample_size, score_ttl=SCORE_TTL_SECONDS, now=None):
+    """
+    Decide which followers to audit and which of them need fetching.
+
+    Without a previous snapshot this is a plain random sample. With one,
+    unchanged followers keep their prior score while it is fresh, expired
+    ones are fetched again, and new followers are sampled at the same rate
+    as the previous audit so the combined sample stays representative.
+
+    Args:
+        followers: Current list of follower usernames
+        previous: Snapshot returned by get_latest_snapshot, or None
+        sample_size: Sample size used for a full audit
+        score_ttl: Maximum age in seconds of a reusable score
+        now: Current timestamp (defaults to time.time())
+
+    Returns:
+        Tuple of (reused, to_fetch) where reused maps username -> is_fake
+        and to_fetch is the list of usernames to fetch and score
+    """
+    if previous is None:
+        return {}, random.sample(followers, min(sample_size, len(followers)))
+
+    now = time.time() if now is None else now
+    added, _, unchanged = diff_followers(previous['followers'], followers)
+
+    reused = {}
+    to_fetch = []
+    for username in unchanged:
+        score = previous['scores'].get(username)
+        if score is None:
+            continue
+        is_fake, scored_at = score
+        if now - scored_at <= score_ttl:
+            reused[username] = is_fake
+        else:
+            to_fetch.append(username)
+
+    if previous['followers']:
+        rate = len(previous['scores']) / len(previous['followers'])
+    else:
+        rate = 1.0
+    new_sample_size = min(len(added), math.ceil(rate * len(added)))
+    to_fetch.extend(random.sample(added, new_sample_size))
+
+    return reused, to_fetch
+
+
+def calculate_churn(previous, followers, scores, complete=False):
+    """
+    Summarise fake-follower churn since the previous snapshot.
+
+    A follower missing from a partial list may simply not have been scrolled
+    into view, so removals and fake-follower losses are only reported (not
+    None) when both the previous and the current lists are complete.
+
+    Args:
+        previous: Snapshot returned by get_latest_snapshot
+        followers: Current list of follower usernames
+        scores: Dictionary of username -> is_fake for the current audit
+        complete: Whether followers is the target's whole follower list
+
+    Returns:
+        Dictionary with follower and fake-follower gains and losses
+    """
+    added, removed, _ = diff_followers(previous['followers'], followers)
+    previous_fakes = {u for u, (is_fake, _) in previous['scores'].items() if is_fake == 1}
+    fakes_gained = [u for u in added if scores.get(u) == 1]
+    comparable = complete and previous.get('complete', False)
+    fakes_lost = [u for u in removed if u in previous_fakes] if comparable else []
+
+    previous_audited = len(previous['scores'])
+    previous_authenticity = ((previous_audited - len(previous_fakes)) * 100) / \
+        previous_audited if previous_audited > 0 else 0
+
+    return {
+        'previous_version': previous['version'],
+        'previous_audit_id': previous['audit_id'],
+        'previous_authenticity_percent': previous_authenticity,
+        'partial_snapshot': not comparable,
+        'new_followers': len(added),
+        'removed_followers': len(removed) if comparable else None,
+        'fake_followers_gained': len(fakes_gained),
+        'fake_followers_lost': len(fakes_lost) if comparable else None,
+        'fake_followers_gained_usernames': fakes_gained,
+        'fake_followers_lost_usernames': fakes_lost,
+    }
@@ -0,0 +1,270 @@
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import (AdaBoostClassifier, ExtraTreesClassifier,
+                              GradientBoostingClassifier, RandomForestClassifier,
+                              VotingClassifier)
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import GridSearchCV, StratifiedKFold
+from sklearn.neighbors import KNeighborsClassifier
+
+import dataset
+from feature_store import FEATURE_COLUMNS
+from profiling import profiled, span
+
+# Paths to the training data and the deployable artifact
+MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(MODEL_DIR, 'data')
+TRAIN_DATA_PATH = os.path.join(DATA_DIR, 'train.csv')
+TEST_DATA_PATH = os.path.join(DATA_DIR, 'test.csv')
+CACHE_DIR = os.path.join(DATA_DIR, 'cache')
+MODEL_ARTIFACT_PATH = os.path.join(DATA_DIR, 'best_model.pkl')
+
+# Cross-validation and latency settings
+N_SPLITS = 5
+RANDOM_STATE = 42
+LATENCY_BATCH_SIZES = [50, 256]
+LATENCY_REPEATS = 20
+
+# Candidates within this accuracy of the best are ranked by latency instead
+ACCURACY_TOLERANCE = 0.01
+
+# Model families compared in the notebook and the grids searched for each
+CANDIDATES = {
+    'RandomForest': (
+        lambda: RandomForestClassifier(random_state=RANDOM_STATE),
+        {'n_estimators': [50, 100, 200], 'max_depth': [None, 8, 16]}),
+    'AdaBoost': (
+        lambda: AdaBoostClassifier(random_state=RANDOM_STATE),
+        {'n_estimators': [50, 100, 200], 'learning_rate': [0.5, 1.0]}),
+    'GradientBoosting': (
+        lambda: GradientBoostingClassifier(random_state=RANDOM_STATE),
+        {'n_estimators': [100, 200], 'max_depth': [2, 3], 'learning_rate': [0.05, 0.1]}),
+    'ExtraTrees': (
+        lambda: ExtraTreesClassifier(random_state=RANDOM_STATE),
+        {'n_estimators': [50, 100, 200], 'max_depth': [None, 8, 16]}),
+    'KNN': (
+        lambda: KNeighborsClassifier(),
+        {'n_neighbors': list(range(1, 10))}),
+    'LogisticRegression': (
+        lambda: LogisticRegression(max_iter=1000),
+        {'C': [0.1, 1.0, 10.0]}),
+    'Voting': (
+        lambda: VotingClassifier([
+            ('rf', RandomForestClassifier(random_state=RANDOM_STATE)),
+            ('ada', AdaBoostClassifier(random_state=RANDOM_STATE)),
+            ('gb', GradientBoostingClassifier(random_state=RANDOM_STATE)),
+            ('et', ExtraTreesClassifier(random_state=RANDOM_STATE)),
+        ]),
+        {'voting': ['hard', 'soft']}),
+}
+
+
+def _file_key(*paths):
+    """Cache key derived from the source files and the rows appended to their caches"""
+    digest = hashlib.sha1()
+    for path in paths:
+        stat = os.stat(path)
+        digest.update(f"{path}:{stat.st_size}:{stat.st_mtime_ns}".encode('utf-8'))
+        version = dataset.current_version(dataset.cache_dir_for(path))
+        if version:
+            digest.update(version.encode('utf-8'))
+    return digest.hexdigest()[:12]
+
+
+def prepare_cache(train_path=TRAIN_DATA_PATH, test_path=TEST_DATA_PATH, cache_dir=CACHE_DIR):
+    """
+    Load the datasets once and cache features, labels and fold splits as .npy files.
+
+    Returns:
+        Dictionary of cached array paths shared with the worker processes
+    """
+    key = _file_key(train_path, test_path)
+    paths = {
+        name: os.path.join(cache_dir, f"{name}-{key}.npy")
+        for name in ['train_X', 'train_Y', 'test_X', 'test_Y', 'folds']
+    }
+    if all(os.path.exists(p) for p in paths.values()):
+        return paths
+
+    os.makedirs(cache_dir, exist_ok=True)
+    train_X, train_Y = dataset.load_training_data(train_path)
+    test_X, test_Y = dataset.load_training_data(test_path)
+    train_X = train_X.to_numpy(dtype=np.float64)
+    train_Y = train_Y.astype(np.int64)
+
+    # Store the fold of every training row so each process uses identical splits
+    folds = np.empty(len(train_Y), dtype=np.int64)
+    skf = StratifiedKFold(n_splits=N_SPLITS, shuffle=True, random_state=RANDOM_STATE)
+    for fold, (_, test_idx) in enumerate(skf.split(train_X, train_Y)):
+        folds[test_idx] = fold
+
+    np.save(paths['train_X'], train_X)
+    np.save(paths['train_Y'], train_Y)
+    np.save(paths['test_X'], test_X.to_numpy(dtype=np.float64))
+    np.save(paths['test_Y'], test_Y.astype(np.int64))
+    np.save(paths['folds'], folds)
+    return paths
+
+
+def load_cached(paths):
+    """Memory-map the cached arrays"""
+    return {name: np.load(path, mmap_mode='r') for name, path in paths.items()}
+
+
+def measure_latency(model, X, batch_sizes=LATENCY_BATCH_SIZES, repeats=LATENCY_REPEATS):
+    """
+    Median time in milliseconds to predict one batch of each size.
+    """
+    latencies = {}
+    for batch_size in batch_sizes:
+        idx = np.resize(np.arange(len(X)), batch_size)
+        batch = pd.DataFrame(X[idx], columns=FEATURE_COLUMNS)
+        model.predict(batch)  # warm-up
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            model.predict(batch)
+            timings.append((time.perf_counter() - start) * 1000)
+        latencies[str(batch_size)] = float(np.median(timings))
+    return latencies
+
+
+def evaluate_candidate(name, paths, n_jobs=1):
+    """
+    Grid-search one model family on the cached folds and score it on test.csv.
+
+    Runs inside a worker process.
+    """
+    data = load_cached(paths)
+    build, grid = CANDIDATES[name]
+    folds = np.asarray(data['folds'])
+    cv = [(np.flatnonzero(folds != k), np.flatnonzero(folds == k))
+          for k in range(N_SPLITS)]
+
+    train_X = pd.DataFrame(np.asarray(data['train_X']), columns=FEATURE_COLUMNS)
+    start = time.perf_counter()
+    search = GridSearchCV(build(), grid, cv=cv, scoring='accuracy', n_jobs=n_jobs)
+    search.fit(train_X, np.asarray(data['train_Y']))
+    fit_seconds = time.perf_counter() - start
+
+    model = search.best_estimator_
+    test_X = np.asarray(data['test_X'])
+    test_predict = model.predict(pd.DataFrame(test_X, columns=FEATURE_COLUMNS))
+
+    return {
+        'name': name,
+        'best_params': search.best_params_,
+        'cv_accuracy': float(search.best_score_),
+        'test_accuracy': float(accuracy_score(data['test_Y'], test_predict)),
+        'latency_ms': measure_latency(model, test_X),
+        'fit_seconds': fit_seconds,
+        'model': model,
+    }
+
+
+def select_model(results, tolerance=ACCURACY_TOLERANCE, max_latency_ms=None):
+    """
+    Pick the fastest candidate whose test accuracy is within tolerance of the best.
+
+    Latency is compared at the largest measured batch size. Candidates slower
+    than max_latency_ms are dropped first when a budget is given.
+    """
+    batch_key = str(max(LATENCY_BATCH_SIZES))
+    eligible = results
+    if max_latency_ms is not None:
+        eligible = [r for r in results if r['latency_ms'][batch_key] <= max_latency_ms] or results
+    best_accuracy = max(r['test_accuracy'] for r in eligible)
+    contenders = [r for r in eligible if r['test_accuracy'] >= best_accuracy - tolerance]
+    return min(contenders, key=lambda r: (r['latency_ms'][batch_key], -r['test_accuracy']))
+
+
+def run_pipeline(candidates=None, workers=None, tolerance=ACCURACY_TOLERANCE,
+                 max_latency_ms=None, output_path=MODEL_ARTIFACT_PATH, report_path=None):
+    """
+    Compare every candidate in parallel and save the winner as the deployable model.
+
+    Args:
+        candidates: Names from CANDIDATES to compare (defaults to all)
+        workers: Number of worker processes (defaults to one per candidate, capped at CPU count)
+        tolerance: Accuracy gap within which the faster model wins
+        max_latency_ms: Optional latency budget per batch
+        output_path: Where to write the pickled winning model
+        report_path: Where to write the comparison report (defaults to
+            output_path with a .json extension)
+
+    Returns:
+        The comparison report dictionary
+    """
+    candidates = candidates or list(CANDIDATES)
+    cpu_count = os.cpu_count() or 1
+    workers = workers or min(len(candidates), cpu_count)
+    # Share the remaining cores between the grid searches inside each worker
+    inner_jobs = max(1, cpu_count // workers)
+
+    with span('prepare_cache'):
+        paths = prepare_cache()
+    print(f"Comparing {len(candidates)} models with {workers} workers x {inner_jobs} jobs...")
+
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(evaluate_candidate, name, paths, inner_jobs)
+                   for name in candidates]
+        for future in futures:
+            with span('wait_candidate'):
+                result = future.result()
+            print(f"  {result['name']}: test accuracy {result['test_accuracy']:.3f}, "
+                  f"latency {result['latency_ms']} ms, fit {result['fit_seconds']:.1f}s")
+            results.append(result)
+
+    winner = select_model(results, tolerance, max_latency_ms)
+    print(f"\nSelected {winner['name']} ({winner['best_params']})")
+
+    with open(output_path, 'wb') as f:
+        pickle.dump(winner['model'], f)
+
+    report = {
+        'winner': winner['name'],
+        'created_at': time.time(),
+        'tolerance': tolerance,
+        'max_latency_ms': max_latency_ms,
+        'results': [{k: v for k, v in r.items() if k != 'model'} for r in results],
+    }
+    report_path = report_path or os.path.splitext(output_path)[0] + '.json'
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compare the notebook models and export the best one')
+    parser.add_argument('--model', action='append', dest='candidates', choices=list(CANDIDATES),
+                        help='Model family to compare (repeatable, defaults to all)')
+    parser.add_argument('--workers', type=int, help='Number of worker processes')
+    parser.add_argument('--tolerance', type=float, default=ACCURACY_TOLERANCE,
+                        help='Accuracy gap within which the faster model wins')
+    parser.add_argument('--max-latency-ms', type=float,
+                        help='Latency budget per batch of %d rows' % max(LATENCY_BATCH_SIZES))
+    parser.add_argument('--output', default=MODEL_ARTIFACT_PATH,
+                        help='Path of the pickled winning model')
+    parser.add_argument('--profile', action='store_true',
+                        help='Capture a profile of the run under data/profiles')
+    args = parser.parse_args()
+
+    with profiled('train_pipeline', enabled=args.profile):
+        run_pipeline(args.candidates, args.workers, args.tolerance,
+                     args.max_latency_ms, args.output)
+
+
+if __name__ == '__main__':
+    main()
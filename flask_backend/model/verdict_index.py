@@ -0,0 +1,279 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+import snapshot_store
+
+# Paths to the index files
+MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(MODEL_DIR, 'data')
+VERDICT_INDEX_DIR = os.path.join(DATA_DIR, 'verdict_index')
+
+# Verdicts below this confidence or older than this are not trusted
+MIN_CONFIDENCE = 0.6
+MAX_VERDICT_AGE_SECONDS = 30 * 24 * 60 * 60
+
+# Sizing of the hash table and the Bloom filter
+LOAD_FACTOR = 0.5
+BLOOM_BITS_PER_ENTRY = 10
+BLOOM_HASHES = 7
+
+# Builds kept on disk besides the live one, for readers still opening them
+KEEP_OLD_VERSIONS = 2
+CURRENT_FILE = 'CURRENT'
+
+TABLE_DTYPE = np.dtype([
+    ('key', '<u8'),
+    ('verdict', 'i1'),
+    ('confidence', '<f4'),
+    ('scored_at', '<f8'),
+])
+UINT64_MASK = (1 << 64) - 1
+
+
+def _hash(username):
+    """Two 64-bit hashes of a username (case-insensitive); 0 marks an empty slot"""
+    digest = hashlib.blake2b(username.lower().encode('utf-8'), digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], 'little') or 1
+    h2 = int.from_bytes(digest[8:], 'little') | 1
+    return h1, h2
+
+
+def _bloom_positions(h1, h2, num_bits, num_hashes):
+    """Bloom filter bit positions by double hashing"""
+    return [((h1 + i * h2) & UINT64_MASK) % num_bits for i in range(num_hashes)]
+
+
+def build_index(records, index_dir=VERDICT_INDEX_DIR):
+    """
+    Write a new index from (username, verdict, confidence, scored_at) records.
+
+    Each build goes to its own versioned directory, and the CURRENT pointer
+    file is swapped to it with a single os.replace. Processes with the old
+    index mapped keep a consistent view until they call refresh(), and a
+    refresh never pairs files from different builds.
+
+    Returns:
+        Number of usernames in the index
+    """
+    records = list(records)
+    count = len(records)
+    capacity = 16
+    while capacity * LOAD_FACTOR < count:
+        capacity *= 2
+    mask = capacity - 1
+    num_bits = max(64, count * BLOOM_BITS_PER_ENTRY)
+
+    table = np.zeros(capacity, dtype=TABLE_DTYPE)
+    keys = [0] * capacity
+    bloom = np.zeros((num_bits + 7) // 8, dtype=np.uint8)
+    bloom_positions = []
+
+    for username, verdict, confidence, scored_at in records:
+        h1, h2 = _hash(username)
+        slot = h1 & mask
+        while keys[slot] not in (0, h1):
+            slot = (slot + 1) & mask
+        keys[slot] = h1
+        table[slot] = (h1, verdict, confidence, scored_at)
+        bloom_positions.extend(_bloom_positions(h1, h2, num_bits, BLOOM_HASHES))
+
+    if bloom_positions:
+        positions = np.asarray(bloom_positions, dtype=np.uint64)
+        np.bitwise_or.at(bloom, (positions >> np.uint64(3)).astype(np.int64),
+                         np.left_shift(np.uint8(1), (positions & np.uint64(7)).astype(np.uint8)))
+
+    version = f'v{time.time_ns()}'
+    version_dir = os.path.join(index_dir, version)
+    os.makedirs(version_dir)
+    meta = {
+        'version': version,
+        'count': count,
+        'capacity': capacity,
+        'bloom_bits': num_bits,
+        'bloom_hashes': BLOOM_HASHES,
+        'built_at': time.time(),
+    }
+    np.save(os.path.join(version_dir, 'table.npy'), table)
+    np.save(os.path.join(version_dir, 'bloom.npy'), bloom)
+    with open(os.path.join(version_dir, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+
+    tmp_path = os.path.join(index_dir, CURRENT_FILE + '.tmp')
+    with open(tmp_path, 'w') as f:
+        f.write(version)
+    os.replace(tmp_path, os.path.join(index_dir, CURRENT_FILE))
+    _remove_old_versions(index_dir, version)
+
+    return count
+
+
+def _remove_old_versions(index_dir, current):
+    """Delete builds older than the live one and the KEEP_OLD_VERSIONS before it"""
+    versions = sorted(
+        (name for name in os.listdir(index_dir)
+         if name.startswith('v') and name[1:].isdigit() and name != current),
+        key=lambda name: int(name[1:]))
+    for name in versions[:max(0, len(versions) - KEEP_OLD_VERSIONS)]:
+        shutil.rmtree(os.path.join(index_dir, name), ignore_errors=True)
+
+
+class VerdictIndex:
+    """
+    Read-only, memory-mapped index of previously scored usernames.
+
+    The table and Bloom filter are mapped from disk, so every worker process
+    that opens the index shares the same page-cache pages. Lookups check the
+    Bloom filter first, so unknown usernames usually cost a few bit tests.
+    """
+
+    def __init__(self, index_dir=VERDICT_INDEX_DIR):
+        self.index_dir = index_dir
+        self.table = None
+        self.bloom = None
+        self.meta = None
+        self.version = None
+        self.refresh()
+
+    def refresh(self):
+        """
+        Re-map the index if CURRENT points to a new build.
+
+        A build whose files do not match its metadata is ignored and the
+        current mapping is kept.
+        """
+        try:
+            with open(os.path.join(self.index_dir, CURRENT_FILE)) as f:
+                version = f.read().strip()
+        except FileNotFoundError:
+            return False
+        if not version or version == self.version:
+            return False
+
+        version_dir = os.path.join(self.index_dir, version)
+        try:
+            with open(os.path.join(version_dir, 'meta.json')) as f:
+                meta = json.load(f)
+            table = np.load(os.path.join(version_dir, 'table.npy'), mmap_mode='r')
+            bloom = np.load(os.path.join(version_dir, 'bloom.npy'), mmap_mode='r')
+        except (OSError, ValueError) as e:
+            print(f"Could not load verdict index {version}: {e}")
+            return False
+        if (meta.get('version') != version or table.shape != (meta['capacity'],)
+                or bloom.size * 8 < meta['bloom_bits']):
+            print(f"Verdict index {version} does not match its metadata, keeping the current one")
+            return False
+
+        self.meta, self.table, self.bloom = meta, table, bloom
+        self.version = version
+        return True
+
+    def __len__(self):
+        return self.meta['count'] if self.meta else 0
+
+    def lookup(self, username):
+        """
+        Find the stored verdict for a username.
+
+        Returns:
+            Tuple of (verdict, confidence, scored_at), or None if unknown
+        """
+        if self.table is None:
+            return None
+        h1, h2 = _hash(username)
+
+        for position in _bloom_positions(h1, h2, self.meta['bloom_bits'], self.meta['bloom_hashes']):
+            if not self.bloom[position >> 3] & (1 << (position & 7)):
+                return None
+
+        mask = self.meta['capacity'] - 1
+        slot = h1 & mask
+        while True:
+            key = int(self.table['key'][slot])
+            if key == h1:
+                entry = self.table[slot]
+                return int(entry['verdict']), float(entry['confidence']), float(entry['scored_at'])
+            if key == 0:
+                return None
+            slot = (slot + 1) & mask
+
+    def known_verdicts(self, usernames, min_confidence=MIN_CONFIDENCE,
+                       max_age=MAX_VERDICT_AGE_SECONDS, now=None):
+        """
+        Split usernames into those with a trusted verdict and the rest.
+
+        Returns:
+            Tuple of (known, unknown) where known maps username -> (verdict, scored_at)
+        """
+        now = time.time() if now is None else now
+        known = {}
+        unknown = []
+        for username in usernames:
+            entry = self.lookup(username)
+            if entry is not None:
+                verdict, confidence, scored_at = entry
+                if confidence >= min_confidence and now - scored_at <= max_age:
+                    known[username] = (verdict, scored_at)
+                    continue
+            unknown.append(username)
+        return known, unknown
+
+
+_shared_index = None
+
+
+def get_verdict_index():
+    """The process-wide index, re-mapped when it has been rebuilt"""
+    global _shared_index
+    if _shared_index is None:
+        _shared_index = VerdictIndex()
+    else:
+        _shared_index.refresh()
+    return _shared_index
+
+
+def records_from_snapshots(conn):
+    """
+    Derive one verdict per username from every score stored in the snapshots.
+
+    The latest verdict wins. Confidence is the share of distinct scorings
+    that agree with it, smoothed so a single scoring gives 2/3.
+    """
+    observations = {}
+    for username, is_fake, scored_at in conn.execute(
+            'SELECT DISTINCT username, is_fake, scored_at FROM snapshot_followers '
+            'WHERE is_fake IS NOT NULL'):
+        observations.setdefault(username.lower(), []).append((scored_at, is_fake))
+
+    for username, scored in observations.items():
+        scored.sort()
+        scored_at, verdict = scored[-1]
+        agree = sum(1 for _, v in scored if v == verdict)
+        yield username, verdict, (agree + 1) / (len(scored) + 2), scored_at
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Rebuild the known-account verdict index from stored audit results')
+    parser.add_argument('--snapshots', default=snapshot_store.SNAPSHOT_DB_PATH,
+                        help='Snapshot database to read scores from')
+    parser.add_argument('--output', default=VERDICT_INDEX_DIR,
+                        help='Directory to write the index to')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    conn = snapshot_store.connect(args.snapshots)
+    try:
+        count = build_index(records_from_snapshots(conn), args.output)
+    finally:
+        conn.close()
+    print(f"Indexed {count} accounts in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
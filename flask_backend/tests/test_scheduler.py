@@ -0,0 +1,71 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'model'))
+import scheduler
+
+
+class ConcurrentSubmitTest(unittest.TestCase):
+    """Submitting while slots are claiming must not wait on the busy timeout"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.release = threading.Event()
+        self.scheduler = scheduler.FairShareScheduler(
+            self.run_audit, slots=2, reserved_slots=1,
+            tenant_quotas={'blocked': scheduler.TenantQuota(1.0, 1, 50)},
+            db_path=os.path.join(self.tmp.name, 'scheduler.db'))
+
+    def tearDown(self):
+        self.release.set()
+        self.scheduler.stop(timeout=10)
+        self.tmp.cleanup()
+
+    def run_audit(self, owner, index):
+        self.release.wait(30)
+        return {'status': 'success', 'owner': owner, 'index': index}
+
+    def test_concurrent_submits_while_jobs_are_blocked_by_quota(self):
+        # One running job and a queue the slots keep polling but cannot start
+        for index in range(5):
+            self.scheduler.submit('blocked', owner='blocked', index=index)
+
+        jobs = []
+        errors = []
+        durations = []
+
+        def submit_many(tenant):
+            for index in range(5):
+                start = time.perf_counter()
+                try:
+                    jobs.append(self.scheduler.submit(
+                        tenant, scheduler.BATCH, owner=tenant, index=index))
+                except Exception as e:
+                    errors.append(e)
+                durations.append(time.perf_counter() - start)
+
+        threads = [threading.Thread(target=submit_many, args=(f'tenant-{i}',))
+                   for i in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(30)
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(jobs), 15)
+        self.assertLess(max(durations), 2.0)
+
+        self.release.set()
+        for job in jobs:
+            result = job.future.result(timeout=30)
+            self.assertEqual(result['status'], 'success')
+        stats = self.scheduler.stats()
+        self.assertEqual(stats['queued_by_tenant'].get('tenant-0', 0), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()